@@ -0,0 +1,194 @@
+"""
+Benchmark suite for the CPU simulation
+Measures steps/second and peak memory of populate, each stage and full steps over a
+matrix of grid sizes, populations and sigmas, with fixed seeds. Results are written
+as JSON lines and can be compared against a stored baseline:
+
+    python benchmark.py --quick --output bench.jsonl
+    python benchmark.py --quick --baseline bench.jsonl --threshold 0.2
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from environment import Environment
+
+SIZES = (200, 500, 1000, 2000, 4000)
+POPULATIONS = (0.01, 0.05, 0.15, 0.3)
+SIGMAS = (0.65, 2, 5)
+QUICK = {"sizes": (200, 500), "populations": (0.05, 0.15), "sigmas": (0.65, 2)}
+
+STAGES = ("diffusion_operator", "motor_stage", "sensory_stage", "step")
+KEY = ("benchmark", "N", "M", "pp", "sigma", "precision")
+
+
+def measure(func, repeat):
+    """
+    Runs func repeat times, returns (seconds per call, peak traced bytes)
+    Timing and memory tracing use separate calls so tracemalloc does not skew timings
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def benchmark_config(
+    N, M, pp, sigma, const=0.85, steps=10, warmup=5, seed=0, precision="double"
+):
+    """
+    Benchmarks one configuration and returns one record per measured operation
+    The environment is warmed up for a few steps first so the particles have
+    trail to sense and neighbours to collide with
+    """
+    config = {"N": N, "M": M, "pp": pp, "sigma": sigma, "precision": precision}
+    records = []
+
+    def record(name, seconds, peak, repeat):
+        records.append(
+            dict(
+                config,
+                benchmark=name,
+                seconds=seconds,
+                steps_per_second=1 / seconds if seconds > 0 else float("inf"),
+                peak_bytes=peak,
+                repeat=repeat,
+            )
+        )
+
+    # populate only works once per environment, so time it and trace it separately
+    environment = Environment(N, M, pp, precision=precision, seed=seed)
+    start = time.perf_counter()
+    environment.populate()
+    seconds = time.perf_counter() - start
+    # the grids are allocated before tracing, so the peak is populate's own memory
+    traced = Environment(N, M, pp, precision=precision, seed=seed)
+    tracemalloc.start()
+    traced.populate()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    record("populate", seconds, peak, 1)
+
+    for _ in range(warmup):
+        environment.step(const, sigma)
+    operations = {
+        "diffusion_operator": lambda: environment.diffusion_operator(const, sigma),
+        "motor_stage": environment.motor_stage,
+        "sensory_stage": environment.sensory_stage,
+        "step": lambda: environment.step(const, sigma),
+    }
+    for name in STAGES:
+        seconds, peak = measure(operations[name], steps)
+        record(name, seconds, peak, steps)
+    return records
+
+
+def run_matrix(
+    sizes=SIZES,
+    populations=POPULATIONS,
+    sigmas=SIGMAS,
+    precision="double",
+    steps=10,
+    seed=0,
+    log=sys.stderr,
+):
+    records = []
+    for size, pp, sigma in itertools.product(sizes, populations, sigmas):
+        results = benchmark_config(
+            size, size, pp, sigma, steps=steps, seed=seed, precision=precision
+        )
+        for r in results:
+            print(
+                "{benchmark:>18} N={N:<5} pp={pp:<5} sigma={sigma:<5} "
+                "{steps_per_second:10.2f}/s {peak_bytes:>12d} B".format(**r),
+                file=log,
+            )
+        records.extend(results)
+    return records
+
+
+def write_records(records, path):
+    meta = {"python": platform.python_version(), "numpy": np.__version__}
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(dict(record, **meta)) + "\n")
+
+
+def load_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(records, baseline, threshold=0.1):
+    """
+    Returns (key, baseline steps/s, current steps/s) for every operation that got
+    slower than the baseline by more than threshold (a fraction, 0.1 = 10%)
+    """
+    reference = {tuple(r[k] for k in KEY): r for r in baseline}
+    regressions = []
+    for record in records:
+        key = tuple(record[k] for k in KEY)
+        if key not in reference:
+            continue
+        before = reference[key]["steps_per_second"]
+        after = record["steps_per_second"]
+        if after < before * (1 - threshold):
+            regressions.append((key, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+")
+    parser.add_argument("--populations", type=float, nargs="+")
+    parser.add_argument("--sigmas", type=float, nargs="+")
+    parser.add_argument("--quick", action="store_true", help="small matrix for CI")
+    parser.add_argument("--precision", default="double")
+    parser.add_argument("--steps", type=int, default=10, help="timed steps per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.jsonl")
+    parser.add_argument("--baseline", help="JSON lines file of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    # --quick only changes the defaults, explicit sizes, populations or sigmas win
+    defaults = (
+        QUICK
+        if args.quick
+        else {"sizes": SIZES, "populations": POPULATIONS, "sigmas": SIGMAS}
+    )
+    matrix = {
+        name: defaults[name] if getattr(args, name) is None else getattr(args, name)
+        for name in defaults
+    }
+    records = run_matrix(
+        precision=args.precision, steps=args.steps, seed=args.seed, **matrix
+    )
+    write_records(records, args.output)
+
+    if args.baseline:
+        regressions = compare(records, load_records(args.baseline), args.threshold)
+        for key, before, after in regressions:
+            print(
+                "REGRESSION {}: {:.2f}/s -> {:.2f}/s".format(
+                    dict(zip(KEY, key)), before, after
+                )
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
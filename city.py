@@ -1,11 +1,11 @@
 from geopy.point import Point
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib
-from matplotlib.widgets import CheckButtons, Slider
+import csv
 import json
+from projection import MAP_BOUNDS, Projection
 
-matplotlib.use("TkAgg")
+# matplotlib (with the TkAgg backend) is only imported by plot_cities_on_map, so
+# importing the city data stays headless and fast
 
 
 class City:
@@ -33,6 +33,172 @@ class City:
         }
 
 
+class CityCatalog:
+    """
+    Cities stored as columns (name, population, lat, lon and size arrays), so
+    filtering and normalizing thousands of settlements are single array operations
+    City objects are only built for the entries that are indexed or iterated
+    """
+
+    def __init__(self, name, population, lat, lon, size=None):
+        self.name = np.asarray(name, dtype=str)
+        self.population = np.asarray(population, dtype=np.int64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.size = (
+            np.zeros(len(self.name)) if size is None else np.asarray(size, dtype=float)
+        )
+        if not (
+            len(self.name)
+            == len(self.population)
+            == len(self.lat)
+            == len(self.lon)
+            == len(self.size)
+        ):
+            raise ValueError("all catalog columns must have the same length")
+        self.objects = {}  # City objects built so far, by row
+        self.cached_projection = None
+
+    @classmethod
+    def from_cities(cls, cities):
+        return cls(
+            [city.name for city in cities],
+            [city.population for city in cities],
+            [city.coordinates.latitude for city in cities],
+            [city.coordinates.longitude for city in cities],
+            [city.size for city in cities],
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a .json list in the City.to_dict layout (slime-simulation/cities.json)
+        or a .csv file with name, population, latitude/lat and longitude/lon/lng
+        columns and optionally size
+        """
+        if path.endswith(".json"):
+            with open(path) as f:
+                records = json.load(f)
+            return cls(
+                [r["name"] for r in records],
+                [r["population"] for r in records],
+                [r["coordinates"]["latitude"] for r in records],
+                [r["coordinates"]["longitude"] for r in records],
+                [r.get("size", 0) for r in records],
+            )
+
+        with open(path, newline="") as f:
+            rows = csv.reader(f)
+            header = [name.strip().lower() for name in next(rows)]
+            columns = {name: [] for name in header}  # an empty file has no rows
+            for row in rows:
+                for name, value in zip(header, row):
+                    columns[name].append(value)
+
+        def column(*aliases):
+            for alias in aliases:
+                if alias in columns:
+                    return columns[alias]
+            raise ValueError("{} has no {} column".format(path, aliases[0]))
+
+        size = columns.get("size")
+        return cls(
+            column("name"),
+            np.asarray(column("population"), dtype=np.float64).astype(np.int64),
+            np.asarray(column("latitude", "lat"), dtype=np.float64),
+            np.asarray(column("longitude", "lon", "lng"), dtype=np.float64),
+            None if size is None else np.asarray(size, dtype=np.float64),
+        )
+
+    def __len__(self):
+        return len(self.name)
+
+    def __getitem__(self, index):
+        """
+        An integer gives a City, a slice, boolean mask or index array a sub-catalog
+        """
+        if isinstance(index, (int, np.integer)):
+            if not -len(self) <= index < len(self):
+                raise IndexError("city index out of range")
+            index = int(index) % len(self)
+            if index not in self.objects:
+                city = City(
+                    str(self.name[index]),
+                    int(self.population[index]),
+                    Point(self.lat[index], self.lon[index]),
+                )
+                city.size = float(self.size[index])
+                self.objects[index] = city
+            return self.objects[index]
+        return CityCatalog(
+            self.name[index],
+            self.population[index],
+            self.lat[index],
+            self.lon[index],
+            self.size[index],
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def filter(self, min_population=None, max_population=None, bounds=None, names=None):
+        """
+        Sub-catalog of the cities matching every given condition
+        bounds = ((lat_min, lat_max), (lon_min, lon_max)), e.g. projection.MAP_BOUNDS
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if min_population is not None:
+            keep &= self.population >= min_population
+        if max_population is not None:
+            keep &= self.population <= max_population
+        if bounds is not None:
+            (lat_min, lat_max), (lon_min, lon_max) = bounds
+            keep &= (self.lat >= lat_min) & (self.lat <= lat_max)
+            keep &= (self.lon >= lon_min) & (self.lon <= lon_max)
+        if names is not None:
+            keep &= np.isin(self.name, list(names))
+        return self[keep]
+
+    def largest(self, k):
+        """
+        Sub-catalog of the k most populous cities, largest first
+        """
+        return self[np.argsort(-self.population, kind="stable")[:k]]
+
+    def normalize(self, total=100):
+        """
+        Sets every size to the city's share of the catalog population, scaled to total
+        """
+        population = self.population.sum()
+        self.size = self.population * (total / max(population, 1))
+        for index, city in self.objects.items():
+            city.size = float(self.size[index])
+        return self.size
+
+    @property
+    def projection(self):
+        """
+        projection.Projection of the catalog coordinates, built once
+        """
+        if self.cached_projection is None:
+            self.cached_projection = Projection(np.column_stack((self.lat, self.lon)))
+        return self.cached_projection
+
+    def to_dicts(self):
+        return [
+            {
+                "name": str(name),
+                "population": int(population),
+                "coordinates": {"latitude": float(lat), "longitude": float(lon)},
+                "size": float(size),
+            }
+            for name, population, lat, lon, size in zip(
+                self.name, self.population, self.lat, self.lon, self.size
+            )
+        ]
+
+
 cities = [
     City("Boston", 650706, Point("42.3601 N 71.0589 W")),
     City("Worcester", 205319, Point("42.2626 N 71.8023 W")),
@@ -46,101 +212,155 @@ cities = [
     City("Fall River", 94044, Point("41.7015 N 71.1550 W")),
 ]
 
-selected_cities = cities[:]
 
-
-# Function to update city sizes based on the selected cities and their populations
-def update_city_sizes():
-    # for all selected cities calculate the total population normalize the their population to get their size
-    city_populations = [city.population for city in selected_cities]
-    total_population = sum(city_populations) if city_populations else 1
-    city_sizes = [
-        (city.population / total_population) * 100 for city in selected_cities
-    ]  # Normalize out of 100
-    return city_sizes
+def normalize_sizes(cities, total=100):
+    """
+    Sets each city's size to its share of the total population, scaled to total
+    The population is summed once, and the sizes stay cached on the cities
+    """
+    total_population = sum(city.population for city in cities) or 1
+    for city in cities:
+        city.size = (city.population / total_population) * total
 
 
 # Makes cities have correctly normalized sizes
-print("All Cities Selected: ")
-for city in selected_cities:
-    total_population = sum(city.population for city in selected_cities)
-    city.size = (city.population / total_population) * 100
-    print(f"{city.name}: Population = {city.population}, Size = {city.size:.2f}")
+normalize_sizes(cities)
+
+
+class CitySelection:
+    """
+    Selected subset of a list of cities, indexed by name
+    The selected population is kept as a running total, so toggling a city is O(1)
+    and the normalized sizes of all cities are one array operation
+    """
+
+    def __init__(self, cities):
+        self.cities = list(cities)
+        self.index = {city.name: i for i, city in enumerate(cities)}
+        self.population = np.array([city.population for city in cities], np.int64)
+        self.selected = np.ones(len(self.population), dtype=bool)
+        self.total = int(self.population.sum())
+
+    def toggle(self, name):
+        """
+        Flips the selection of a city and returns whether it is now selected
+        """
+        i = self.index[name]
+        self.selected[i] = not self.selected[i]
+        if self.selected[i]:
+            self.total += int(self.population[i])
+        else:
+            self.total -= int(self.population[i])
+        return bool(self.selected[i])
+
+    def sizes(self, total=100):
+        """
+        Share of the selected population of every city scaled to total, 0 when the
+        city is not selected
+        """
+        scale = total / self.total if self.total else 0.0
+        return np.where(self.selected, self.population * scale, 0.0)
+
+    def apply_sizes(self, total=100):
+        """
+        Writes sizes() back to the City objects and returns them
+        """
+        sizes = self.sizes(total)
+        for city, size in zip(self.cities, sizes.tolist()):
+            city.size = size
+        return sizes
+
+    def selected_cities(self):
+        return [self.cities[i] for i in np.flatnonzero(self.selected)]
 
 
 # Function to plot cities on the map image
-def plot_cities_on_map(cities, map_image_path):
+def plot_cities_on_map(cities, map_image_path, max_labels=50):
+    """
+    Interactive map of the cities with a checkbox per city, point sizes are each
+    selected city's share of the selected population
+    max_labels = cities are only labelled when there are at most this many
+    """
+    import matplotlib
+
+    matplotlib.use("TkAgg")
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import CheckButtons, Slider
 
     # Load the map image of Massachusetts
     img = plt.imread(map_image_path)
 
     # Latitude and longitude Bounds of the map
-    lat_min, lat_max = 41.00, 43.00
-    lon_min, lon_max = -73.50, -69.90
+    (lat_min, lat_max), (lon_min, lon_max) = MAP_BOUNDS
 
     fig, ax = plt.subplots(figsize=(10, 8))
 
     # Massachusetts map on plot as background
     ax.imshow(img, extent=[lon_min, lon_max, lat_min, lat_max])
 
-    city_scatter_plots = {}
-    city_labels = []
+    selection = CitySelection(cities)
+    lat = np.array([city.coordinates.latitude for city in cities])
+    lon = np.array([city.coordinates.longitude for city in cities])
+
+    # every city is one point of a single scatter collection, deselected cities just
+    # get size 0, so a toggle updates one artist however many cities there are
+    scatter = ax.scatter(lon, lat, color="red", s=selection.sizes(), animated=True)
+    labels = {}
+    if len(cities) <= max_labels:
+        for city, size, x, y in zip(cities, selection.sizes(), lon, lat):
+            labels[city.name] = ax.text(
+                x, y, f"{city.name}\nSize: {size:.2f}", fontsize=7, animated=True
+            )
+    background = None
 
-    # Plot each city on the map with the initial size (considering all cities in cities list)
-    for city in selected_cities:
-        lat, lon = city.coordinates.latitude, city.coordinates.longitude
-        scatter_plot = ax.scatter(lon, lat, color="red", s=city.size, label=city.name)
-        text_plot = ax.text(
-            lon, lat, f"{city.name}\nSize: {city.size:.2f}", color="black", fontsize=7
-        )
-        city_scatter_plots[city.name] = (scatter_plot, text_plot)
-        city_labels.append(city.name)
+    def on_draw(event):
+        # the static map is cached, blitting only redraws the animated artists
+        nonlocal background
+        background = fig.canvas.copy_from_bbox(ax.bbox)
+        draw_artists()
+
+    def draw_artists():
+        ax.draw_artist(scatter)
+        for text in labels.values():
+            if text.get_visible():
+                ax.draw_artist(text)
 
     # Update plot sizes
     def update_plot():
-        city_sizes = (
-            update_city_sizes()
-        )  # Calculate new city sizes based on selected cities lists
-        print("\nSelected cities: ")
-
-        # update new sizes for selected cities
-        for city, size in zip(selected_cities, city_sizes):
-            scatter_plot, text_plot = city_scatter_plots[city.name]
-            city.size = size
-            scatter_plot.set_sizes([size])
-
-            lat, lon = city.coordinates.latitude, city.coordinates.longitude
-            text_plot.set_position((lon, lat))
-            text_plot.set_text(f"{city.name}\nSize: {city.size:.2f}")
-
-            print(
-                f"{city.name}: Population = {city.population}, size = {city.size:.2f}"
-            )
-
-        plt.draw()  # Redraw the plot
+        sizes = selection.apply_sizes()  # keeps City.size in sync with the map
+        scatter.set_sizes(sizes)
+        for name, text in labels.items():
+            if text.get_visible():
+                size = sizes[selection.index[name]]
+                text.set_text(f"{name}\nSize: {size:.2f}")
+
+        if background is None:
+            fig.canvas.draw_idle()
+            return
+        fig.canvas.restore_region(background)
+        draw_artists()
+        fig.canvas.blit(ax.bbox)
+        fig.canvas.flush_events()
+
+    fig.canvas.mpl_connect("draw_event", on_draw)
 
     # Create checkboxes to select cities
     rax = plt.axes([0.01, 0.4, 0.15, 0.2], frameon=False)
 
     check = CheckButtons(
-        rax, city_labels, [True] * len(city_labels)
+        rax, [city.name for city in cities], [True] * len(cities)
     )  # All cities selected on initialization
 
     # Selection toggle
     def toggle_visibility(label):
-        scatter, text = city_scatter_plots[label]
-        visible = not scatter.get_visible()
-        scatter.set_visible(visible)
-        text.set_visible(visible)
-
-        # Update the selected cities list
-        if visible:
-            selected_cities.append(next(city for city in cities if city.name == label))
-        else:
-            selected_cities[:] = [
-                city for city in selected_cities if city.name != label
-            ]
-
+        visible = selection.toggle(label)
+        if label in labels:
+            labels[label].set_visible(visible)
+        city = cities[selection.index[label]]
+        print(
+            f"{city.name} {'selected' if visible else 'removed'}: "
+            f"total population = {selection.total}"
+        )
         update_plot()  # Recalculate sizes and update the plot
 
     check.on_clicked(
@@ -186,6 +406,7 @@ def plot_cities_on_map(cities, map_image_path):
     )  # run the slider function on diffusion change
 
     plt.show()
+    return selection
 
 
 if __name__ == "__main__":
@@ -197,10 +418,10 @@ if __name__ == "__main__":
         print(f"{city.name}: Population = {city.population}, Size = {city.size:.2f}")
 
     # Plot the cities on the map
-    plot_cities_on_map(cities, map_image_path)
+    selection = plot_cities_on_map(cities, map_image_path)
 
-    # Convert the list of City instances to a list of dictionaries
-    cities_dict = [city.to_dict() for city in cities]
+    # Convert the selected City instances, with their renormalized sizes, to dicts
+    cities_dict = [city.to_dict() for city in selection.selected_cities()]
 
     # Serialize the list of dictionaries to JSON
     with open("slime-simulation/cities.json", "w") as f:
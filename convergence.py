@@ -0,0 +1,127 @@
+"""
+Early stopping for runs whose trail network has stabilized
+The monitor looks at a block-averaged copy of the trail map every few steps, so a
+check costs a fraction of a step and the steps in between cost nothing
+"""
+
+import types
+import numpy as np
+
+
+def downsample(arr, factor):
+    """
+    Block mean over factor x factor cells, trailing rows/columns that do not fill a
+    block are dropped
+    """
+    if factor <= 1:
+        return np.array(arr, dtype=np.float64)
+    N, M = arr.shape[0] // factor, arr.shape[1] // factor
+    blocks = arr[: N * factor, : M * factor].reshape(N, factor, M, factor)
+    return blocks.mean(axis=(1, 3), dtype=np.float64)
+
+
+class ConvergenceMonitor:
+    """
+    Decides when a run has converged
+    every = steps between checks
+    factor = downsampling factor of the trail map
+    smoothing = weight of each check in a running average of the downsampled maps,
+    smaller values remember more checks
+    tolerance = largest relative change still counted as stable, for both the L1
+    distance of the downsampled snapshot from the running average of the earlier
+    checks and the change in the number of network cells (cells above the mean)
+    between the two
+    The snapshot itself is compared, not the smoothed average, so maps that keep
+    changing never look stable however much the average smooths them out
+    window = consecutive stable checks needed to stop
+    After stopping, reason and step say why and when
+    """
+
+    def __init__(self, every=10, factor=8, smoothing=0.1, tolerance=0.1, window=5):
+        if every < 1 or window < 1:
+            raise ValueError("every and window must be at least 1")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be in (0, 1]")
+        self.every = every
+        self.factor = factor
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.window = window
+        self.average = None
+        self.stable = 0
+        self.history = []
+        self.reason = None
+        self.step = None
+
+    @property
+    def converged(self):
+        return self.reason is not None
+
+    def update(self, environment):
+        """
+        Called after every step, returns True once the run should stop
+        """
+        if self.converged:
+            return True
+        if environment.steps % self.every != 0:
+            return False
+
+        current = downsample(environment.trail_map, self.factor)
+        average = self.average
+        if average is None:
+            self.average = current
+            return False
+        self.average = average + self.smoothing * (current - average)
+
+        total = np.abs(average).sum()
+        l1 = np.abs(current - average).sum() / total if total else 0.0
+        network = np.count_nonzero(average > average.mean())
+        count = abs(np.count_nonzero(current > current.mean()) - network)
+        count /= max(network, 1)
+        self.history.append(
+            {"step": environment.steps, "l1": float(l1), "network": count}
+        )
+
+        if l1 < self.tolerance and count < self.tolerance:
+            self.stable += 1
+        else:
+            self.stable = 0
+        if self.stable >= self.window:
+            self.step = environment.steps
+            self.reason = (
+                "relative L1 change {:.2e} and network change {:.2e} below {:g} "
+                "for {} checks".format(l1, count, self.tolerance, self.window)
+            )
+            return True
+        return False
+
+
+def check_uncorrelated(size=(200, 200), checks=200, seed=0, **kwargs):
+    """
+    Feeds a monitor (built with kwargs) trail maps whose blobs are redrawn at random
+    at every check, so consecutive maps are about 40% apart in L1, and returns
+    whether it rightly never reported convergence
+    """
+    from scipy import ndimage
+
+    rng = np.random.default_rng(seed)
+    monitor = ConvergenceMonitor(**kwargs)
+    environment = types.SimpleNamespace(steps=0, trail_map=None)
+    for _ in range(checks):
+        sources = np.zeros(size)
+        sources[rng.integers(0, size[0], 60), rng.integers(0, size[1], 60)] = 1
+        environment.trail_map = ndimage.gaussian_filter(sources, 6, mode="wrap")
+        environment.trail_map += 0.003
+        environment.steps += monitor.every
+        if monitor.update(environment):
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    for smoothing in (0.1, 1):
+        if not check_uncorrelated(smoothing=smoothing):
+            raise SystemExit(
+                "uncorrelated maps converged with smoothing {}".format(smoothing)
+            )
+    print("uncorrelated maps never converge")
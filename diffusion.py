@@ -0,0 +1,159 @@
+"""
+Diffusion backends for the trail map
+spatial = truncated Gaussian filter from scipy.ndimage, works with any boundary mode
+spectral = multiplication by a cached Gaussian transfer function in rfft2 space,
+periodic ("wrap") boundaries only, cheaper for large sigma
+"""
+
+import functools
+import time
+import numpy as np
+from scipy import fft, ndimage, optimize
+
+TRUNCATE = 4.0  # scipy.ndimage default, kernel radius in units of sigma
+
+# seconds per step for each trail dtype, fitted to crossover_benchmark() on a single
+# core (refit on the current machine with calibrate())
+# spatial = overhead + cells * (per cell + per cell and kernel tap * kernel width)
+# spectral = overhead + cells * (per cell + per cell and FFT level * log2(cells))
+COSTS = {
+    "float64": {
+        "spatial": (1.0e-5, 1.0e-8, 8.0e-10),
+        "spectral": (0.0, 0.0, 1.6e-9),
+    },
+    "float32": {
+        "spatial": (6.0e-5, 8.5e-9, 8.5e-10),
+        "spectral": (5.5e-5, 0.0, 8.5e-10),
+    },
+}
+
+
+def kernel_width(sigma):
+    return 2 * int(TRUNCATE * sigma + 0.5) + 1
+
+
+def cost_terms(backend, shape, sigma):
+    """
+    Features the cost coefficients of a backend multiply: (1, cells, cells * x)
+    """
+    cells = shape[0] * shape[1]
+    x = kernel_width(sigma) if backend == "spatial" else np.log2(cells)
+    return np.array([1.0, cells, cells * x])
+
+
+def predicted_cost(backend, shape, sigma, dtype=np.float64):
+    """
+    Estimated seconds for one diffusion step of the given backend
+    dtypes without their own coefficients use the float64 ones
+    """
+    costs = COSTS.get(np.dtype(dtype).name, COSTS["float64"])
+    return float(np.dot(costs[backend], cost_terms(backend, shape, sigma)))
+
+
+def choose_backend(shape, sigma, mode="wrap", dtype=np.float64):
+    """
+    Picks the cheaper backend for a grid shape, sigma and trail dtype
+    The spectral backend is only considered for periodic boundaries
+    """
+    if mode != "wrap":
+        return "spatial"
+    if predicted_cost("spectral", shape, sigma, dtype) < predicted_cost(
+        "spatial", shape, sigma, dtype
+    ):
+        return "spectral"
+    return "spatial"
+
+
+def periodic_kernel(length, sigma):
+    """
+    The sampled, truncated Gaussian used by scipy.ndimage, wrapped onto a period
+    """
+    radius = int(TRUNCATE * sigma + 0.5)
+    offsets = np.arange(-radius, radius + 1)
+    weights = np.exp(-0.5 * (offsets / sigma) ** 2) if sigma > 0 else offsets == 0
+    kernel = np.zeros(length)
+    np.add.at(kernel, offsets % length, weights / np.sum(weights))
+    return kernel
+
+
+@functools.lru_cache(maxsize=16)
+def transfer_function(shape, sigma, const, dtype):
+    """
+    Transfer function of the periodic Gaussian filter in rfft2 layout, decay folded in
+    Built from the same sampled kernel as the spatial backend so both agree
+    """
+    ky = fft.fft(periodic_kernel(shape[0], sigma)).real
+    kx = fft.rfft(periodic_kernel(shape[1], sigma)).real
+    return (const * ky[:, None] * kx[None, :]).astype(dtype)
+
+
+def spatial_diffusion(trail, out, const, sigma, mode="wrap"):
+    ndimage.gaussian_filter(trail, sigma, output=out, mode=mode, truncate=TRUNCATE)
+    out *= const
+    return out
+
+
+def spectral_diffusion(trail, out, const, sigma, mode="wrap"):
+    if mode != "wrap":
+        raise ValueError("spectral diffusion requires periodic ('wrap') boundaries")
+    transfer = transfer_function(trail.shape, float(sigma), float(const), trail.dtype)
+    spectrum = fft.rfft2(trail)
+    spectrum *= transfer
+    out[...] = fft.irfft2(spectrum, s=trail.shape, overwrite_x=True)
+    return out
+
+
+BACKENDS = {"spatial": spatial_diffusion, "spectral": spectral_diffusion}
+
+
+def diffuse(trail, out, const, sigma, mode="wrap", backend="auto"):
+    """
+    Writes the diffused and decayed trail into out and returns it
+    backend = "spatial", "spectral" or "auto" to choose by grid size and sigma
+    """
+    if backend == "auto":
+        backend = choose_backend(trail.shape, sigma, mode, trail.dtype)
+    if backend not in BACKENDS:
+        raise ValueError("unknown diffusion backend: {}".format(backend))
+    return BACKENDS[backend](trail, out, const, sigma, mode)
+
+
+def crossover_benchmark(
+    sizes=(128, 256, 512, 1024), sigmas=(0.65, 1, 2, 3, 5), repeat=3, dtype=np.float32
+):
+    """
+    Times both backends over a matrix of square grids and sigmas
+    Returns a list of (size, sigma, spatial seconds, spectral seconds)
+    """
+    records = []
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        trail = rng.random((size, size)).astype(dtype)
+        out = np.empty_like(trail)
+        for sigma in sigmas:
+            timings = []
+            for backend in ("spatial", "spectral"):
+                BACKENDS[backend](trail, out, 1.0, sigma)  # warm up caches
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    BACKENDS[backend](trail, out, 1.0, sigma)
+                timings.append((time.perf_counter() - start) / repeat)
+            records.append((size, sigma, *timings))
+    return records
+
+
+def calibrate(dtype=np.float64, **kwargs):
+    """
+    Runs crossover_benchmark for one trail dtype and refits its cost model
+    Accepts the same keyword arguments as crossover_benchmark
+    """
+    records = crossover_benchmark(dtype=dtype, **kwargs)
+    costs = {}
+    for column, backend in ((2, "spatial"), (3, "spectral")):
+        terms = np.array([cost_terms(backend, (r[0], r[0]), r[1]) for r in records])
+        seconds = np.array([r[column] for r in records])
+        # relative least squares, so small grids count as much as large ones
+        fit, _ = optimize.nnls(terms / seconds[:, None], np.ones(len(records)))
+        costs[backend] = tuple(float(c) for c in fit)
+    COSTS[np.dtype(dtype).name] = costs
+    return records
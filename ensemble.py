@@ -0,0 +1,183 @@
+"""
+Batched ensemble of environments advanced together in stacked arrays
+K members share the grid size and population but may differ in sigma, const and
+particle parameters. Maps are (K, N, M) and particle columns are (K, P)
+"""
+
+import numpy as np
+from scipy import fft, ndimage
+from diffusion import transfer_function
+from environment import PRECISIONS, motor_step
+from particle import turn_directions
+
+
+def member_parameter(value, K):
+    """
+    Broadcasts a scalar or per-member sequence to a (K, 1) column
+    """
+    return np.broadcast_to(np.asarray(value, dtype=np.float64), (K,)).reshape(K, 1)
+
+
+class Ensemble:
+    def __init__(
+        self,
+        K,
+        N=200,
+        M=200,
+        pp=0.15,
+        const=0.85,
+        sigma=0.65,
+        sensor_distance=9.0,
+        sensor_angle=np.pi / 8,
+        angular_speed=np.pi / 4,
+        precision="single",
+        boundary="wrap",
+        seed=None,
+    ):
+        """
+        K = number of members, every other parameter is a scalar shared by all members
+        or a sequence of K per-member values (const, sigma and the particle parameters)
+        boundary = "wrap" diffuses all members in one batched FFT, any other
+        scipy.ndimage mode filters one group of members per distinct sigma
+        seed = seed or SeedSequence, spawned into one independent stream per member so
+        a member's run does not depend on the other members
+        """
+        data_dtype, trail_dtype, position_dtype = PRECISIONS[precision]
+        self.K = K
+        self.N = N
+        self.M = M
+        self.boundary = boundary
+        self.population = int((self.N * self.M) * (pp))
+        self.position_dtype = position_dtype
+        self.rngs = [
+            np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(K)
+        ]
+
+        self.const = member_parameter(const, K)
+        self.sigma = member_parameter(sigma, K)
+        self.sensor_distance = member_parameter(sensor_distance, K)
+        self.sensor_angle = member_parameter(sensor_angle, K)
+        self.angular_speed = member_parameter(angular_speed, K)
+
+        self.data_map = np.zeros(shape=(K, N, M), dtype=data_dtype)
+        self.trail_map = np.zeros(shape=(K, N, M), dtype=trail_dtype)
+        self.trail_buffer = np.zeros_like(self.trail_map)
+        self.transfer = None
+        if boundary == "wrap":
+            self.transfer = np.stack(
+                [
+                    transfer_function((N, M), float(s), float(c), trail_dtype)
+                    for s, c in zip(self.sigma.ravel(), self.const.ravel())
+                ]
+            )
+
+        self.rows = np.zeros((K, 0), dtype=position_dtype)
+        self.cols = np.zeros((K, 0), dtype=position_dtype)
+        self.orientation = np.zeros((K, 0))
+        self.steps = 0
+
+    def populate(self):
+        """
+        randomly populates pp% of every member's map, each from its own random draw
+        """
+        count = self.population
+        keys = np.stack([rng.random(self.N * self.M) for rng in self.rngs])
+        cells = np.argpartition(keys, count - 1, axis=1)[:, :count]
+        rows, cols = np.divmod(cells, self.M)
+        members = np.arange(self.K)[:, None]
+        self.data_map[members, rows, cols] = 1
+        self.rows = rows.astype(self.position_dtype)
+        self.cols = cols.astype(self.position_dtype)
+        angles = np.stack([rng.random(count) for rng in self.rngs])
+        self.orientation = 2 * np.pi * angles
+
+    def diffusion_operator(self):
+        """
+        Gaussian diffusion and decay of every member with its own sigma and const
+        """
+        if self.transfer is not None:
+            spectrum = fft.rfft2(self.trail_map, axes=(-2, -1))
+            spectrum *= self.transfer
+            self.trail_buffer[...] = fft.irfft2(
+                spectrum, s=(self.N, self.M), axes=(-2, -1), overwrite_x=True
+            )
+        else:
+            sigmas = self.sigma.ravel()
+            for sigma in np.unique(sigmas):
+                group = np.flatnonzero(sigmas == sigma)
+                self.trail_buffer[group] = ndimage.gaussian_filter(
+                    self.trail_map[group], (0, sigma, sigma), mode=self.boundary
+                )
+            self.trail_buffer *= self.const[:, :, None]
+        self.trail_map, self.trail_buffer = self.trail_buffer, self.trail_map
+
+    def motor_stage(self):
+        """
+        Batched motor stage of every member, see Environment.motor_stage
+        Targets are flattened over the whole stack so one conflict resolution
+        handles all members
+        """
+        # members never compete for a cell, so each can order its own particles
+        P = self.rows.shape[1]
+        order = np.concatenate(
+            [rng.permutation(P) + k * P for k, rng in enumerate(self.rngs)]
+        )
+
+        def random_turns(blocked):
+            per_member = np.count_nonzero(blocked, axis=1)
+            return np.concatenate(
+                [rng.random(n) for rng, n in zip(self.rngs, per_member)]
+            )
+
+        motor_step(
+            self.rows,
+            self.cols,
+            self.orientation,
+            self.data_map,
+            self.trail_map,
+            order,
+            random_turns,
+        )
+
+    def sensory_stage(self):
+        """
+        Batched sensory stage of every member, see ParticleStore.sense
+        """
+        members = np.arange(self.K)[:, None]
+        values = []
+        for side in (-1, 0, 1):
+            angle = self.orientation + side * self.sensor_angle
+            x = np.rint(self.sensor_distance * np.cos(angle)).astype(np.intp)
+            y = np.rint(self.sensor_distance * np.sin(angle)).astype(np.intp)
+            n = (self.rows - x) % self.N
+            m = (self.cols + y) % self.M
+            values.append(self.trail_map[members, n, m])
+        self.orientation += turn_directions(*values, self.rngs) * self.angular_speed
+
+    def step(self):
+        self.diffusion_operator()
+        self.motor_stage()
+        self.sensory_stage()
+        self.steps += 1
+
+    def run(self, steps=500):
+        """
+        Advances every member by steps and returns the final maps and summary statistics
+        """
+        for _ in range(steps):
+            self.step()
+        return {"trail_map": self.trail_map.copy(), **self.summary()}
+
+    def summary(self):
+        """
+        Per-member statistics of the trail map, each an array of length K
+        coverage = fraction of cells holding more chemoattractant than the member mean
+        """
+        trail = self.trail_map.reshape(self.K, -1)
+        mean = trail.mean(axis=1)
+        return {
+            "mean": mean,
+            "std": trail.std(axis=1),
+            "max": trail.max(axis=1),
+            "coverage": (trail > mean[:, None]).mean(axis=1),
+        }
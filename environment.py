@@ -1,103 +1,571 @@
-import random
+import functools
+import json
+import os
 import numpy as np
 from scipy import ndimage
-from particle import Particle
+from diffusion import diffuse
+from particle import ParticleStore
+from projection import MAP_BOUNDS, city_projection
+
+
+def resolve_moves(target, occupancy, order):
+    """
+    Decides which particles get to move into their target cell
+    target = flat index of the cell each particle wants, occupancy = flat data map
+    order = random priority order of the particles, e.g. rng.permutation(len(target))
+    A move succeeds if the cell was empty at the start of the step and the particle
+    has the highest random priority of all particles competing for that cell
+    """
+    candidates = order[occupancy[target[order]] == 0]
+    # np.unique reports the first occurrence, i.e. the highest priority candidate
+    _, first = np.unique(target[candidates], return_index=True)
+    moved = np.zeros(len(target), dtype=bool)
+    moved[candidates[first]] = True
+    return moved
+
+
+def facing_cells(rows, cols, orientation, N, M):
+    """
+    The adjacent cell each particle faces, based on particle angle
+    periodic BCs -> %
+    """
+    n = (rows - np.rint(np.cos(orientation)).astype(np.intp)) % N
+    m = (cols + np.rint(np.sin(orientation)).astype(np.intp)) % M
+    return n, m
+
+
+def motor_step(rows, cols, orientation, data_map, trail_map, order, random_turns):
+    """
+    Motor stage shared by Environment, parallel.Worker and ensemble.Ensemble
+    Every particle tries to step onto the cell it faces, updating its columns, the
+    occupancy and the trail deposits in place
+    rows, cols, orientation = (..., P) particle columns for maps of shape (..., N, M),
+    e.g. (K, P) columns of a (K, N, M) ensemble, whose members never share a cell
+    order = priority order over the flattened particles, see resolve_moves
+    random_turns(blocked) = uniform [0, 1) draws for the particles that could not
+    move, in the order of orientation[blocked]
+    Returns the boolean mask of particles that moved
+    """
+    N, M = data_map.shape[-2:]
+    new_x, new_y = facing_cells(rows, cols, orientation, N, M)
+    # flat indices over the whole stack of maps
+    offset = np.arange(int(np.prod(rows.shape[:-1]))).reshape(rows.shape[:-1] + (1,))
+    offset = offset * (N * M)
+    target = offset + new_x * M + new_y
+    moved = resolve_moves(target.ravel(), data_map.ravel(), order)
+    moved = moved.reshape(target.shape)
+
+    # move invalid, stay and choose new orientation
+    blocked = ~moved
+    orientation[blocked] = 2 * np.pi * random_turns(blocked)
+
+    # move valid: update data map, deposit trail, AND change particle position
+    data_map.ravel()[(offset + rows * M + cols)[moved]] = 0
+    data_map.ravel()[target[moved]] = 1
+    trail_map.ravel()[target[moved]] = 1.0
+    rows[moved] = new_x[moved]
+    cols[moved] = new_y[moved]
+    return moved
+
+
+@functools.lru_cache(maxsize=64)
+def disc_offsets(rad):
+    """
+    (row, col) offsets of every cell within rad of the center, cached per radius
+    """
+    r = int(np.floor(rad))
+    y, x = np.mgrid[-r : r + 1, -r : r + 1]
+    inside = x**2 + y**2 <= rad**2
+    return y[inside], x[inside]
+
+
+def block_cells(rows, cols, factor):
+    """
+    (row, col) of the factor x factor fine cells covering each coarse cell,
+    one row of factor**2 cells per coarse cell
+    """
+    dy, dx = np.divmod(np.arange(factor**2), factor)
+    return rows[:, None] * factor + dy, cols[:, None] * factor + dx
+
+
+def split_state(value, name="rng"):
+    """
+    JSON-safe copy of a bit generator state, returned with the arrays it held
+    Array fields (the MT19937 key, the Philox counter, ...) are replaced by
+    {"npz": entry} and returned as {entry: array} to be saved next to the JSON
+    """
+    if isinstance(value, np.ndarray):
+        return {"npz": name}, {name: value}
+    if not isinstance(value, dict):
+        return value, {}
+    state, arrays = {}, {}
+    for key, item in value.items():
+        state[key], nested = split_state(item, "{}.{}".format(name, key))
+        arrays.update(nested)
+    return state, arrays
+
+
+def join_state(value, arrays):
+    """
+    Inverse of split_state(), arrays = mapping of the saved entries (e.g. an NpzFile)
+    """
+    if not isinstance(value, dict):
+        return value
+    if set(value) == {"npz"}:
+        return np.array(arrays[value["npz"]])
+    return {key: join_state(item, arrays) for key, item in value.items()}
+
+
+# dtypes of the occupancy grid, trail map and particle position columns
+PRECISIONS = {
+    "double": (np.float64, np.float64, np.int64),
+    "single": (np.uint8, np.float32, np.int32),
+    "compact": (np.bool_, np.float32, np.int16),
+}
 
 
 class Environment:
-    def __init__(self, N=200, M=200, pp=0.15):
+    def __init__(
+        self,
+        N=200,
+        M=200,
+        pp=0.15,
+        precision="double",
+        boundary="wrap",
+        diffusion="auto",
+        seed=None,
+    ):
         """
         pp = percentage of the map size to generate population. default 15% - 6000 particles in 200x200 environment
+        precision = "double" (float64 maps), "single" (uint8 occupancy, float32 trail,
+        int32 positions) or "compact" (bool occupancy, float32 trail, int16 positions)
+        boundary = scipy.ndimage mode used by the diffusion operator, "wrap" matches the
+        periodic BCs of sensing and motion
+        diffusion = "spatial", "spectral" (FFT, wrap only) or "auto" to pick the cheaper
+        backend for the grid size and sigma
+        seed = seed, SeedSequence or np.random.Generator that drives every random draw,
+        so runs with the same seed are exactly reproducible
         """
+        if precision not in PRECISIONS:
+            raise ValueError("unknown precision: {}".format(precision))
+        data_dtype, trail_dtype, position_dtype = PRECISIONS[precision]
+        if max(N, M) > np.iinfo(position_dtype).max:
+            raise ValueError("map too large for {} positions".format(precision))
+
         self.N = N
         self.M = M
-        self.data_map = np.zeros(shape=(N, M))
-        self.trail_map = np.zeros(shape=(N, M))
+        self.precision = precision
+        self.data_map = np.zeros(shape=(N, M), dtype=data_dtype)
+        self.trail_map = np.zeros(shape=(N, M), dtype=trail_dtype)
+        self.trail_buffer = np.zeros_like(self.trail_map)  # diffusion ping-pong target
+        self.boundary = boundary
+        self.diffusion = diffusion
         self.population = int((self.N * self.M) * (pp))
-        self.particles = []  # holds particles
+        self.rng = np.random.default_rng(seed)
+        # holds particle state as array columns, sharing the environment's generator
+        self.particles = ParticleStore(position_dtype=position_dtype, rng=self.rng)
+        self.steps = 0  # number of completed step() calls
+        self.instrumentation = None  # attach an Instrumentation to record timings
+        # persistent food: flat trail map indices and the strength stamped on them
+        self.food_index = np.zeros(0, dtype=np.intp)
+        self.food_strength = np.zeros(0, dtype=trail_dtype)
+        # flat indices of the cells blocked by obstacles
+        self.obstacle_index = np.zeros(0, dtype=np.intp)
 
-    def populate(self):
+    def populate(self, strategy="uniform", sites=None, spread=10.0, density=None):
         """
         randomly populates pp% of the map with particles of:
         SA = Sensor Angle
         RA = Rotation Angle
         SO = Sensor Offset
+        strategy = "uniform" spreads particles over every free cell,
+        "seeded" gathers them around the (n, m) positions in sites (e.g. food or cities)
+        with a Gaussian falloff of width spread, and "mask" samples free cells in
+        proportion to the supplied density array
+        All cells are drawn at once without replacement, so no cell is used twice
         """
-        while np.sum(self.data_map) < self.population:  # loop until population size met
-            rN = np.random.randint(self.N)
-            rM = np.random.randint(self.M)
-            if self.data_map[rN, rM] == 0:
-                p = Particle((rN, rM))
-                self.particles.append(p)  # list holds particle and its position
-                self.data_map[rN, rM] = (
-                    1  # assign a value of 1 to the particle location
-                )
-            else:
-                pass
+        count = self.population - len(self.particles)
+        if count <= 0:
+            return
 
-    def deposit_food(self, pos, strength=3, rad=6):
+        if strategy == "uniform":
+            log_weights = None
+        elif strategy == "seeded":
+            log_weights = self.seed_density(sites, spread, log=True)
+        elif strategy == "mask":
+            density = np.asarray(density, dtype=np.float64)
+            if density.shape != (self.N, self.M):
+                raise ValueError("density must have the same shape as the map")
+            with np.errstate(divide="ignore"):
+                log_weights = np.log(density)
+        else:
+            raise ValueError("unknown populate strategy: {}".format(strategy))
+
+        free = np.flatnonzero(self.data_map.ravel() == 0)
+        if log_weights is None:
+            keys = self.rng.random(len(free))
+        else:
+            log_weights = log_weights.ravel()[free]
+            keep = log_weights > -np.inf
+            free, log_weights = free[keep], log_weights[keep]
+            # the largest Gumbel-perturbed log weights are a weighted sample
+            keys = log_weights + self.rng.gumbel(size=len(free))
+        if len(free) < count:
+            raise ValueError("not enough free cells to place the population")
+        # keep the count largest keys: a sample without replacement in O(N*M)
+        cells = free[np.argpartition(-keys, count - 1)[:count]]
+
+        rows, cols = np.divmod(cells, self.M)
+        self.data_map[rows, cols] = 1  # assign a value of 1 to the particle location
+        self.particles.add(rows, cols)  # store holds particle positions and state
+
+    def seed_density(self, sites, spread=10.0, log=False):
+        """
+        Builds a placement density that peaks at each (n, m) site and falls off as a
+        Gaussian of the periodic distance to the nearest site
+        Sites are rounded to their cell, and the distance to the nearest one comes
+        from a single distance transform, so thousands of sites cost the same as one
+        log = return the log density, which does not underflow far from the sites
+        """
+        sites = np.asarray(sites, dtype=np.float64).reshape(-1, 2)
+        if len(sites) == 0:
+            raise ValueError("seeded placement needs at least one site")
+        mask = np.ones((self.N, self.M), dtype=bool)
+        n, m = np.rint(sites).astype(np.intp).T
+        mask[n % self.N, m % self.M] = False  # the transform measures to False cells
+
+        # periodic BCs: the nearest image of a site is at most half the map away, so
+        # padding by half a map with wrapped copies covers every cell
+        pad_n, pad_m = self.N // 2 + 1, self.M // 2 + 1
+        padded = np.pad(mask, ((pad_n, pad_n), (pad_m, pad_m)), mode="wrap")
+        distance = ndimage.distance_transform_edt(padded)
+        nearest = distance[pad_n : pad_n + self.N, pad_m : pad_m + self.M] ** 2
+        log_density = -nearest / (2 * spread**2)
+        return log_density if log else np.exp(log_density)
+
+    def food_stamp(self, pos, rad):
         """
-        applies a circular distribution of food to the trail map
+        flat trail map indices of a circular stamp of radius rad around pos
+        uses periodic BCs like sensing and motion
         """
         n, m = pos  # location of food
-        y, x = np.ogrid[
-            -n : self.N - n, -m : self.M - m
-        ]  # work directly on pixels of the trail map
-        mask = x**2 + y**2 <= rad**2  # create circular mask of desired radius
-        self.trail_map[mask] = strength
+        dy, dx = disc_offsets(rad)
+        return ((n + dy) % self.N) * self.M + (m + dx) % self.M
 
-    def diffusion_operator(self, const=0.6, sigma=2):
+    def deposit_food(self, pos, strength=3, rad=6):
+        """
+        applies a circular distribution of food to the trail map, once
+        """
+        self.trail_map.ravel()[self.food_stamp(pos, rad)] = strength
+
+    def add_food(self, pos, strength=3, rad=6):
+        """
+        registers a persistent food source, re-applied by apply_food() every step
+        the stamp is computed once, so applying all food costs O(total stamp area)
+        """
+        self.add_foods([pos], strength, rad)
+
+    def add_foods(self, positions, strengths=3, rads=6):
+        """
+        registers many food sources at once, see add_food()
+        positions = (n, m) of each source, strengths and rads = one per source or
+        one for all of them
+        the registered stamps are extended once, not once per source
+        """
+        positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+        strengths = np.broadcast_to(strengths, len(positions))
+        rads = np.broadcast_to(rads, len(positions))
+        stamps = [self.food_stamp(pos, rad) for pos, rad in zip(positions, rads)]
+        if not stamps:
+            return
+        index = np.concatenate(stamps)
+        strength = np.repeat(
+            strengths.astype(self.trail_map.dtype), [len(stamp) for stamp in stamps]
+        )
+        self.food_index = np.concatenate((self.food_index, index))
+        self.food_strength = np.concatenate((self.food_strength, strength))
+        self.trail_map.ravel()[index] = strength
+
+    def add_city_food(self, cities, strength=3, max_rad=10, bounds=MAP_BOUNDS):
+        """
+        registers a food source for every city.City (or every city of a CityCatalog),
+        placed by its coordinates within the (lat, lon) bounds and with an area
+        proportional to its population
+        """
+        # north is row 0, as in the map image
+        if hasattr(cities, "projection"):  # a city.CityCatalog, already columnar
+            projection, population = cities.projection, cities.population
+        else:
+            projection = city_projection(tuple(cities))
+            population = np.array([city.population for city in cities])
+        rows, cols = projection.pixels((self.N - 1, self.M - 1), bounds, origin="north")
+        population = population.astype(np.float64)
+        rads = np.maximum(1.0, max_rad * np.sqrt(population / population.max()))
+        self.add_foods(np.column_stack((rows, cols)).astype(int), strength, rads)
+
+    def add_obstacles(self, obstacles):
+        """
+        rasterizes obstacle.Obstacle instances into the occupancy grid, once
+        blocked cells stay occupied, so the motor stage rejects moves into them with
+        the same check it uses for other particles, and diffusion clears their trail
+        particles already standing on a blocked cell are removed
+        """
+        blocked = np.zeros((self.N, self.M), dtype=bool)
+        for obstacle in obstacles:
+            blocked |= obstacle.rasterize(self.N, self.M)
+        blocked.ravel()[self.obstacle_index] = False
+        index = np.flatnonzero(blocked)
+
+        p = self.particles
+        self.particles.remove(blocked[p.rows, p.cols])
+        self.data_map.ravel()[index] = 1
+        self.trail_map.ravel()[index] = 0
+        self.obstacle_index = np.concatenate((self.obstacle_index, index))
+
+    def apply_food(self):
+        """
+        re-stamps every registered food source onto the trail map
+        """
+        self.trail_map.ravel()[self.food_index] = self.food_strength
+
+    def diffusion_operator(self, const=0.6, sigma=2, mode=None):
         """
         applies a Gaussian filter to the entire trail map, spreading out chemoattractant
         const multiplier controls decay rate (lower = greater rate of decay, keep <1)
+        mode overrides the boundary handling of the environment for this call
+        The filter writes into the spare buffer, which then becomes the trail map, so
+        no full-size arrays are allocated per step
         Credit to: https://github.com/ecbaum/physarum/blob/8280cd131b68ed8dff2f0af58ca5685989b8cce7/species.py#L52
         """
-        self.trail_map = const * ndimage.gaussian_filter(self.trail_map, sigma)
+        diffuse(
+            self.trail_map,
+            self.trail_buffer,
+            const,
+            sigma,
+            mode=mode or self.boundary,
+            backend=self.diffusion,
+        )
+        self.trail_map, self.trail_buffer = self.trail_buffer, self.trail_map
+        self.trail_map.ravel()[self.obstacle_index] = 0  # no trail under obstacles
 
-    def check_surroundings(self, point, angle):
+    def check_surroundings(self, rows, cols, orientation):
         """
         Helper function for motor_stage()
-        Determines if the adjacent spot in the data map is available, based on particle angle
-        """
-        n, m = point
-        x = np.cos(angle)
-        y = np.sin(angle)
-        # periodic BCs -> %
-        if (
-            self.data_map[(n - round(x)) % self.N, (m + round(y)) % self.M] == 0
-        ):  # position unoccupied, move there
-            return ((n - round(x)) % self.N, (m + round(y)) % self.M)
-        elif (
-            self.data_map[(n - round(x)) % self.N, (m + round(y)) % self.M] == 1
-        ):  # position occupied, stay
-            return point
+        Returns the adjacent cell each particle faces, based on particle angle
+        """
+        return facing_cells(rows, cols, orientation, self.N, self.M)
 
     def motor_stage(self):
         """
         Scheduler function - causes every particle in population to undergo motor stage
-        Particles randomly sampled to avoid long-term bias from sequential ordering
+        Conflicts are settled by a random per-step priority to avoid ordering bias
         """
-        rand_order = random.sample(self.particles, len(self.particles))
-        for i in range(len(rand_order)):
-            old_x, old_y = rand_order[i].position
-            new_x, new_y = self.check_surroundings(
-                rand_order[i].position, rand_order[i].orientation
+        p = self.particles
+        moved = motor_step(
+            p.rows,
+            p.cols,
+            p.orientation,
+            self.data_map,
+            self.trail_map,
+            self.rng.permutation(len(p)),
+            lambda blocked: self.rng.random(np.count_nonzero(blocked)),
+        )
+
+        if self.instrumentation is not None:
+            succeeded = np.count_nonzero(moved)
+            self.instrumentation.count(
+                moves_attempted=len(moved),
+                moves_succeeded=succeeded,
+                moves_blocked=len(moved) - succeeded,
             )
-            if (new_x, new_y) == (
-                old_x,
-                old_y,
-            ):  # move invalid, stay and choose new orientation, update sensors
-                rand_order[i].orientation = 2 * np.pi * np.random.random()
-            else:  # move valid: move there, change value in data map accordingly, deposit trail, AND change particle position
-                rand_order[i].position = (new_x, new_y)
-                self.data_map[old_x, old_y] = 0
-                self.data_map[new_x, new_y] = 1
-                rand_order[i].deposit_phermone_trail(self.trail_map)
 
     def sensory_stage(self):
         """
-        Makes every particle undergo sensory stage in random order
+        Makes every particle undergo sensory stage in one batched pass
+        Sensing only reads the trail map, so the result does not depend on order
+        """
+        if self.instrumentation is None:
+            self.particles.sense(self.trail_map)
+        else:
+            counts = {}
+            self.particles.sense(self.trail_map, counts)
+            self.instrumentation.count(**counts)
+
+    def step(self, const=0.6, sigma=2):
+        """
+        One full simulation step: diffusion, motor stage, food and sensory stage
+        food sources are re-applied before sensing so they never wash out
+        """
+        if self.instrumentation is None:
+            self.diffusion_operator(const, sigma)
+            self.motor_stage()
+            self.apply_food()
+            self.sensory_stage()
+        else:
+            stage = self.instrumentation.stage
+            self.instrumentation.begin_step(self.steps)
+            stage("diffusion_operator", self.diffusion_operator, const, sigma)
+            stage("motor_stage", self.motor_stage)
+            stage("apply_food", self.apply_food)
+            stage("sensory_stage", self.sensory_stage)
+        self.steps += 1
+
+    def refine(self, factor=2):
         """
-        rand_order = random.sample(self.particles, len(self.particles))
-        for i in range(len(rand_order)):
-            rand_order[i].sense(self.trail_map)
+        Returns the environment carried over to a grid factor times finer in both
+        directions, for coarse-to-fine runs
+        The trail map is interpolated, every particle becomes a factor x factor block
+        of particles with its orientation and sensors reaching factor times as far, and
+        food and obstacles cover the matching blocks
+        The random generator is shared, so seeded coarse-to-fine runs are reproducible
+        """
+        fine = Environment(
+            self.N * factor,
+            self.M * factor,
+            0,
+            precision=self.precision,
+            boundary=self.boundary,
+            diffusion=self.diffusion,
+            seed=self.rng,
+        )
+        fine.steps = self.steps
+        fine.instrumentation = self.instrumentation
+
+        mode = "grid-wrap" if self.boundary == "wrap" else "nearest"
+        fine.trail_map[...] = ndimage.zoom(
+            self.trail_map, factor, order=1, mode=mode, grid_mode=True
+        )
+
+        def refine_index(index):
+            rows, cols = block_cells(*np.divmod(index, self.M), factor)
+            return (rows * fine.M + cols).ravel()
+
+        fine.food_index = refine_index(self.food_index)
+        fine.food_strength = np.repeat(self.food_strength, factor**2)
+        fine.obstacle_index = refine_index(self.obstacle_index)
+        fine.data_map.ravel()[fine.obstacle_index] = 1
+        fine.trail_map.ravel()[fine.obstacle_index] = 0
+        fine.apply_food()
+
+        p = self.particles
+        columns = {name: np.repeat(p.columns()[name], factor**2) for name in p.COLUMNS}
+        rows, cols = block_cells(p.rows, p.cols, factor)
+        columns.update(rows=rows.ravel(), cols=cols.ravel())
+        columns["sensor_distance"] = columns["sensor_distance"] * factor
+        fine.particles.extend(columns)
+        fine.particles.default_sensor_distance = p.default_sensor_distance * factor
+        fine.particles.default_sensor_angle = p.default_sensor_angle
+        fine.particles.default_angular_speed = p.default_angular_speed
+        fine.data_map[fine.particles.rows, fine.particles.cols] = 1
+        fine.population = len(fine.particles)
+        return fine
+
+    @classmethod
+    def coarse_to_fine(
+        cls,
+        N=200,
+        M=200,
+        pp=0.15,
+        levels=3,
+        steps=100,
+        const=0.6,
+        sigma=2,
+        factor=2,
+        setup=None,
+        **kwargs,
+    ):
+        """
+        Multi-resolution run: starts on a grid factor**(levels-1) times coarser than
+        N x M, steps at every level and refines until the full grid is reached
+        steps = steps per level, one int or a sequence with one entry per level,
+        coarsest first
+        sigma and the sensor distance are given for the full grid and scaled down on
+        the coarser grids, so every level organizes the same network geometry
+        setup = called with the coarsest environment before it is populated, e.g. to
+        add food or obstacles (map.Map.apply), which are carried over to finer levels
+        kwargs = precision, boundary, diffusion and seed of the Environment
+        returns the full resolution environment
+        """
+        scale = factor ** (levels - 1)
+        if N % scale or M % scale:
+            raise ValueError("N and M must be divisible by factor**(levels - 1)")
+        steps = np.broadcast_to(steps, (levels,))
+
+        environment = cls(N // scale, M // scale, pp, **kwargs)
+        environment.particles.default_sensor_distance /= scale
+        if setup is not None:
+            setup(environment)
+        environment.populate()
+        for level in range(levels):
+            if level > 0:
+                environment = environment.refine(factor)
+                scale //= factor
+            for _ in range(steps[level]):
+                environment.step(const, sigma / scale)
+        return environment
+
+    def save_checkpoint(self, path, **params):
+        """
+        Saves the complete simulation state to an uncompressed .npz file
+        params = extra run parameters to keep with the state (e.g. const and sigma)
+        The file is written next to path and renamed, so a crash never leaves a
+        truncated checkpoint behind
+        """
+        config = {
+            "N": self.N,
+            "M": self.M,
+            "population": self.population,
+            "precision": self.precision,
+            "boundary": self.boundary,
+            "diffusion": self.diffusion,
+            "steps": self.steps,
+            "params": params,
+        }
+        config["rng"], rng_arrays = split_state(self.rng.bit_generator.state)
+        tmp = "{}.tmp.npz".format(path)
+        np.savez(
+            tmp,
+            config=json.dumps(config),
+            trail_map=self.trail_map,
+            data_map=self.data_map,
+            food_index=self.food_index,
+            food_strength=self.food_strength,
+            obstacle_index=self.obstacle_index,
+            **self.particles.columns(),
+            **rng_arrays,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_checkpoint(cls, path):
+        """
+        Rebuilds an Environment from save_checkpoint() including the state of its
+        random generator, so the run continues exactly as if it was never interrupted
+        The extra run parameters are available as checkpoint_params
+        """
+        with np.load(path) as checkpoint:
+            config = json.loads(str(checkpoint["config"]))
+            state = join_state(config["rng"], checkpoint)
+            bit_generator = getattr(np.random, state["bit_generator"])()
+            bit_generator.state = state
+            environment = cls(
+                config["N"],
+                config["M"],
+                0,
+                precision=config["precision"],
+                boundary=config["boundary"],
+                diffusion=config["diffusion"],
+                seed=np.random.Generator(bit_generator),
+            )
+            environment.population = config["population"]
+            environment.steps = config["steps"]
+            environment.trail_map[...] = checkpoint["trail_map"]
+            environment.data_map[...] = checkpoint["data_map"]
+            environment.food_index = checkpoint["food_index"]
+            environment.food_strength = checkpoint["food_strength"]
+            environment.obstacle_index = checkpoint["obstacle_index"]
+            environment.particles.extend(
+                {name: checkpoint[name] for name in ParticleStore.COLUMNS}
+            )
+        environment.checkpoint_params = config["params"]
+        return environment
@@ -0,0 +1,107 @@
+"""
+Per-stage timing and counters for the simulation loop
+An Environment only records anything while an Instrumentation is attached to it, so
+an uninstrumented run pays for a single attribute check per stage
+"""
+
+import json
+import time
+
+
+class Instrumentation:
+    """
+    Collects one record per step: the start and duration of each stage in nanoseconds
+    (time.perf_counter_ns) and the counters reported by the stages
+    """
+
+    def __init__(self):
+        self.records = []
+        self.current = None
+
+    def begin_step(self, step):
+        self.current = {"step": step, "stages": {}, "counters": {}}
+        self.records.append(self.current)
+
+    def stage(self, name, func, *args):
+        """
+        Calls func(*args) and records how long it took under name
+        """
+        if self.current is None:
+            self.begin_step(None)
+        start = time.perf_counter_ns()
+        result = func(*args)
+        self.current["stages"][name] = (start, time.perf_counter_ns() - start)
+        return result
+
+    def count(self, **counters):
+        if self.current is None:
+            self.begin_step(None)
+        totals = self.current["counters"]
+        for name, value in counters.items():
+            totals[name] = totals.get(name, 0) + int(value)
+
+    def summary(self):
+        """
+        Totals over every recorded step: seconds per stage and summed counters
+        """
+        seconds, counters = {}, {}
+        for record in self.records:
+            for name, (_, duration) in record["stages"].items():
+                seconds[name] = seconds.get(name, 0.0) + duration * 1e-9
+            for name, value in record["counters"].items():
+                counters[name] = counters.get(name, 0) + value
+        return {"steps": len(self.records), "seconds": seconds, "counters": counters}
+
+    def write_jsonl(self, path):
+        """
+        One JSON object per step with stage durations in seconds and the counters
+        """
+        with open(path, "w") as f:
+            for record in self.records:
+                line = {"step": record["step"]}
+                for name, (_, duration) in record["stages"].items():
+                    line[name] = duration * 1e-9
+                line.update(record["counters"])
+                f.write(json.dumps(line) + "\n")
+
+    def write_chrome_trace(self, path):
+        """
+        Chrome trace event format, open with chrome://tracing or Perfetto
+        Stages are complete ("X") events and counters are counter ("C") events
+        """
+        events = []
+        for record in self.records:
+            for name, (start, duration) in record["stages"].items():
+                events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": start / 1000,
+                        "dur": duration / 1000,
+                        "pid": 0,
+                        "tid": 0,
+                        "args": {"step": record["step"]},
+                    }
+                )
+            if record["counters"] and record["stages"]:
+                start = min(start for start, _ in record["stages"].values())
+                events.append(
+                    {
+                        "name": "counters",
+                        "ph": "C",
+                        "ts": start / 1000,
+                        "pid": 0,
+                        "args": record["counters"],
+                    }
+                )
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def export(self, path):
+        """
+        Writes a Chrome trace for .json paths and JSON lines otherwise
+        """
+        if path.endswith(".json"):
+            self.write_chrome_trace(path)
+        else:
+            self.write_jsonl(path)
@@ -6,3 +6,11 @@ class Map:
     def __init__(self, cities: list[City], obstacles: list[Obstacle] = []):
         self.cities = cities
         self.obstacles = obstacles
+
+    def apply(self, environment, strength=3, max_rad=10):
+        """
+        Adds the obstacles and a food source for every city to an Environment
+        Call before populate() so no particle starts inside an obstacle
+        """
+        environment.add_obstacles(self.obstacles)
+        environment.add_city_food(self.cities, strength, max_rad)
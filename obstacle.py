@@ -1,3 +1,67 @@
+import numpy as np
+
+
 class Obstacle:
-    def __init__(self):
-        pass
+    """
+    A region particles cannot enter (coastline, water, ...)
+    Given either as a polygon of (row, col) vertices or as a boolean mask, both in a
+    coordinate frame of the given size (height, width), and rasterized onto a grid of
+    any size with rasterize()
+    """
+
+    def __init__(self, polygon=None, mask=None, size=None):
+        if (polygon is None) == (mask is None):
+            raise ValueError("an obstacle needs either a polygon or a mask")
+        self.polygon = None if polygon is None else np.asarray(polygon, dtype=float)
+        self.mask = None if mask is None else np.asarray(mask, dtype=bool)
+        if size is None and self.mask is not None:
+            size = self.mask.shape
+        self.size = size
+
+    @classmethod
+    def from_image(cls, path, threshold=0.5, invert=False):
+        """
+        Reads an image and blocks its bright pixels, e.g. the white sea and
+        neighbouring states around the land in mass.jpg
+        invert = block the dark pixels instead
+        """
+        import matplotlib.image
+
+        img = matplotlib.image.imread(path)
+        if img.dtype == np.uint8:
+            img = img / 255
+        gray = img[..., :3].mean(axis=-1) if img.ndim == 3 else img
+        mask = gray < threshold if invert else gray > threshold
+        return cls(mask=mask)
+
+    def rasterize(self, N, M):
+        """
+        Boolean (N, M) grid of the cells covered by the obstacle
+        """
+        if self.mask is not None:
+            # nearest neighbour resampling of the mask onto the grid
+            rows = (np.arange(N) + 0.5) * self.mask.shape[0] // N
+            cols = (np.arange(M) + 0.5) * self.mask.shape[1] // M
+            return self.mask[rows.astype(int)[:, None], cols.astype(int)[None, :]]
+
+        vertices = self.polygon
+        if self.size is not None:
+            vertices = vertices * (N / self.size[0], M / self.size[1])
+        blocked = np.zeros((N, M), dtype=bool)
+        r0, c0 = np.maximum(np.floor(vertices.min(axis=0)).astype(int), 0)
+        r1, c1 = np.minimum(np.ceil(vertices.max(axis=0)).astype(int) + 1, (N, M))
+        if r0 >= r1 or c0 >= c1:
+            return blocked
+
+        # even-odd rule on the cell centers inside the bounding box
+        y = np.arange(r0, r1)[:, None] + 0.5
+        x = np.arange(c0, c1)[None, :] + 0.5
+        inside = np.zeros((r1 - r0, c1 - c0), dtype=bool)
+        for (ya, xa), (yb, xb) in zip(vertices, np.roll(vertices, -1, axis=0)):
+            if ya == yb:
+                continue
+            crosses = (ya > y) != (yb > y)
+            x_cross = xa + (y - ya) * (xb - xa) / (yb - ya)
+            inside ^= crosses & (x < x_cross)
+        blocked[r0:r1, c0:c1] = inside
+        return blocked
@@ -0,0 +1,323 @@
+"""
+Domain-decomposed Environment running on several worker processes
+The grid is split into row strips, one per worker. Trail maps and occupancy live in
+multiprocessing.shared_memory so halo rows are read straight from the neighbouring
+strips, and particles migrate between workers when they cross a strip border
+"""
+
+import multiprocessing as mp
+import threading
+import traceback
+from multiprocessing import shared_memory
+import numpy as np
+from diffusion import TRUNCATE, diffuse
+from environment import PRECISIONS, motor_step
+from particle import ParticleStore
+
+DATA_DTYPE, TRAIL_DTYPE, POSITION_DTYPE = PRECISIONS["single"]
+
+
+def strip_bounds(N, workers):
+    """
+    Splits N rows into contiguous strips, one (start, stop) pair per worker
+    """
+    edges = np.linspace(0, N, workers + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def strip_colours(workers):
+    """
+    Colours strips so that no two strips sharing a border move in the same phase
+    Particles move at most one row per step, so same-coloured strips never compete
+    for a cell. An odd number of periodic strips needs a third colour
+    """
+    colours = [i % 2 for i in range(workers)]
+    if workers > 1 and workers % 2 == 1:
+        colours[-1] = 2
+    return colours
+
+
+def attach(name, shape, dtype):
+    """
+    Opens a shared memory block created by the parent, which stays responsible for it
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+class WorkerError(RuntimeError):
+    """
+    Failure inside a worker process, carrying the worker's formatted traceback
+    secondary = the worker only failed because another one did (broken barrier)
+    """
+
+    def __init__(self, index, message, secondary=False):
+        super().__init__(index, message, secondary)
+        self.index = index
+        self.message = message
+        self.secondary = secondary
+
+    def __str__(self):
+        return "worker {} failed:\n{}".format(self.index, self.message)
+
+
+class Worker:
+    """
+    Owns the particles of one row strip and advances them in lockstep with the others
+    """
+
+    def __init__(self, index, config, barrier, inboxes, commands, results):
+        self.index = index
+        self.N, self.M = config["shape"]
+        self.workers = config["workers"]
+        self.diffusion = config["diffusion"]
+        self.r0, self.r1 = strip_bounds(self.N, self.workers)[index]
+        self.colour = strip_colours(self.workers)[index]
+        self.phases = max(strip_colours(self.workers)) + 1
+        self.barrier = barrier
+        self.inbox = inboxes[index]
+        self.prev = inboxes[(index - 1) % self.workers]
+        self.next = inboxes[(index + 1) % self.workers]
+        self.commands = commands
+        self.results = results
+
+        shape = (self.N, self.M)
+        self.shm_data, self.data_map = attach(config["data"], shape, DATA_DTYPE)
+        self.shm_trails, self.trails = attach(
+            config["trails"], (2,) + shape, TRAIL_DTYPE
+        )
+        self.current = 0  # which of the two trail buffers holds the trail map
+
+        # every worker draws from its own independent stream of the run's SeedSequence
+        self.rng = np.random.default_rng(config["seeds"][index])
+        self.particles = ParticleStore(position_dtype=POSITION_DTYPE, rng=self.rng)
+
+    def run(self):
+        """
+        Serves commands until "stop", every command gets exactly one result
+        On an error the barrier is aborted and the neighbours' inboxes are poisoned,
+        so no other worker stays blocked, and the error is reported as the result
+        """
+        try:
+            while True:
+                command, *args = self.commands.get()
+                if command == "add":
+                    self.particles.extend(args[0])
+                    self.results.put(len(self.particles))
+                elif command == "step":
+                    steps, const, sigma = args
+                    for _ in range(steps):
+                        self.step(const, sigma)
+                    self.results.put(len(self.particles))
+                elif command == "gather":
+                    self.results.put((self.index, self.particles.columns()))
+                elif command == "stop":
+                    break
+        except Exception as exc:
+            self.barrier.abort()
+            self.prev.put(None)
+            self.next.put(None)
+            secondary = isinstance(exc, threading.BrokenBarrierError)
+            self.results.put(WorkerError(self.index, traceback.format_exc(), secondary))
+        finally:
+            self.shm_data.close()
+            self.shm_trails.close()
+
+    def step(self, const, sigma):
+        self.diffusion_stage(const, sigma)
+        self.barrier.wait()  # every strip of the new trail map is written
+        self.current = 1 - self.current
+        for phase in range(self.phases):
+            if phase == self.colour:
+                self.motor_stage()
+            self.barrier.wait()  # occupancy and deposits of this phase are final
+        self.migrate()
+        self.particles.sense(self.trails[self.current])
+
+    def diffusion_stage(self, const, sigma):
+        """
+        Diffuses the owned strip from a slab padded with halo rows of the neighbours
+        The halo covers the kernel radius, so the periodic wrap used on the slab only
+        touches halo rows and the strip itself matches a full-grid diffusion
+        """
+        halo = int(TRUNCATE * sigma + 0.5)
+        rows = np.arange(self.r0 - halo, self.r1 + halo) % self.N
+        slab = self.trails[self.current][rows]
+        out = np.empty_like(slab)
+        diffuse(slab, out, const, sigma, mode="wrap", backend=self.diffusion)
+        self.trails[1 - self.current][self.r0 : self.r1] = out[
+            halo : halo + self.r1 - self.r0
+        ]
+
+    def motor_stage(self):
+        p = self.particles
+        motor_step(
+            p.rows,
+            p.cols,
+            p.orientation,
+            self.data_map,
+            self.trails[self.current],
+            self.rng.permutation(len(p)),
+            lambda blocked: self.rng.random(np.count_nonzero(blocked)),
+        )
+
+    def migrate(self):
+        """
+        Hands particles that left the strip to the neighbouring workers
+        Every worker sends exactly one message to each neighbour per step
+        """
+        if self.workers == 1:
+            return
+        rows = self.particles.rows
+        above = rows == (self.r0 - 1) % self.N
+        below = (rows < self.r0) | (rows >= self.r1)
+        below &= ~above
+        self.prev.put((0, self.particles.remove(above)))
+        self.next.put((1, self.particles.remove(below[~above])))
+        # messages arrive in any order, append them in a fixed one to stay reproducible
+        messages = [self.inbox.get() for _ in range(2)]
+        if None in messages:
+            raise threading.BrokenBarrierError("a neighbouring worker failed")
+        messages.sort(key=lambda m: m[0])
+        for _, columns in messages:
+            self.particles.extend(columns)
+
+
+def run_worker(*args):
+    Worker(*args).run()
+
+
+class ParallelEnvironment:
+    """
+    Environment whose grid is split into row strips advanced by worker processes
+    Uses single precision maps (uint8 occupancy, float32 trail) in shared memory
+    """
+
+    def __init__(
+        self, N=200, M=200, pp=0.15, workers=None, diffusion="auto", seed=None
+    ):
+        """
+        seed = seed or SeedSequence, spawned into one stream for populate and one
+        independent stream per worker
+        """
+        workers = workers or mp.cpu_count()
+        if N < 2 * workers:
+            raise ValueError("every worker needs a strip of at least 2 rows")
+        self.N = N
+        self.M = M
+        self.workers = workers
+        self.population = int((self.N * self.M) * (pp))
+        self.current = 0
+        sequence = np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(sequence.spawn(1)[0])
+
+        cells = N * M
+        self.shm_data = shared_memory.SharedMemory(
+            create=True, size=cells * np.dtype(DATA_DTYPE).itemsize
+        )
+        self.shm_trails = shared_memory.SharedMemory(
+            create=True, size=2 * cells * np.dtype(TRAIL_DTYPE).itemsize
+        )
+        self.data_map = np.ndarray((N, M), dtype=DATA_DTYPE, buffer=self.shm_data.buf)
+        self.trails = np.ndarray(
+            (2, N, M), dtype=TRAIL_DTYPE, buffer=self.shm_trails.buf
+        )
+        self.data_map[:] = 0
+        self.trails[:] = 0
+
+        config = {
+            "shape": (N, M),
+            "workers": workers,
+            "diffusion": diffusion,
+            "data": self.shm_data.name,
+            "trails": self.shm_trails.name,
+            "seeds": sequence.spawn(workers),
+        }
+        barrier = mp.Barrier(workers)
+        inboxes = [mp.Queue() for _ in range(workers)]
+        self.commands = [mp.Queue() for _ in range(workers)]
+        self.results = mp.Queue()
+        self.processes = [
+            mp.Process(
+                target=run_worker,
+                args=(i, config, barrier, inboxes, self.commands[i], self.results),
+                daemon=True,
+            )
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def trail_map(self):
+        return self.trails[self.current]
+
+    def collect(self):
+        """
+        One result per worker, re-raises a worker failure in this process
+        (preferring the original error over the ones it caused in other workers)
+        """
+        results = [self.results.get() for _ in range(self.workers)]
+        errors = [r for r in results if isinstance(r, WorkerError)]
+        if errors:
+            raise min(errors, key=lambda error: error.secondary)
+        return results
+
+    def broadcast(self, *command):
+        for queue in self.commands:
+            queue.put(command)
+        return self.collect()
+
+    def populate(self):
+        """
+        randomly populates pp% of the map and hands every particle to its strip owner
+        """
+        free = np.flatnonzero(self.data_map.ravel() == 0)
+        count = min(self.population, len(free))
+        keys = self.rng.random(len(free))
+        cells = free[np.argpartition(keys, count - 1)[:count]]
+        rows, cols = np.divmod(cells, self.M)
+        self.data_map[rows, cols] = 1
+
+        store = ParticleStore(position_dtype=POSITION_DTYPE, rng=self.rng)
+        store.add(rows, cols)
+        for i, (r0, r1) in enumerate(strip_bounds(self.N, self.workers)):
+            owned = (store.rows >= r0) & (store.rows < r1)
+            self.commands[i].put(("add", store.remove(owned)))
+        return sum(self.collect())
+
+    def step(self, const=0.6, sigma=2, steps=1):
+        """
+        Advances every strip by steps full diffusion, motor and sensory stages
+        """
+        self.broadcast("step", steps, const, sigma)
+        self.current = (self.current + steps) % 2
+
+    def gather(self):
+        """
+        Collects the particles of every worker into a single ParticleStore
+        """
+        parts = sorted(self.broadcast("gather"), key=lambda part: part[0])
+        store = ParticleStore(position_dtype=POSITION_DTYPE)
+        for _, columns in parts:
+            store.extend(columns)
+        return store
+
+    def close(self):
+        if self.processes is None:
+            return
+        for queue in self.commands:
+            queue.put(("stop",))
+        for process in self.processes:
+            process.join()
+        self.processes = None
+        self.shm_data.close()
+        self.shm_data.unlink()
+        self.shm_trails.close()
+        self.shm_trails.unlink()
@@ -1,13 +1,223 @@
 import numpy as np
 
 
+def turn_directions(L, C, R, rng, counts=None):
+    """
+    Applies the turn rules of Particle.sense to arrays of sensor values
+    Returns +1 (turn right), -1 (turn left) or 0 (keep heading) per particle
+    rng = np.random.Generator for the tie-breaks, or one Generator per row when the
+    sensor values are stacked (K, P) arrays of independent ensemble members
+    counts = optional dict that receives the number of particles turning left, right
+    and randomly
+    """
+    # Only particles whose center is not greater than both sensors turn
+    turn = (C <= L) & (C <= R)
+    tie = turn & (L == R)
+    right = turn & (R > L)
+    left = turn & (L > R)
+    direction = right.astype(np.int8) - left
+    # Left and right equal, turn randomly
+    ties = np.count_nonzero(tie)
+    if isinstance(rng, (list, tuple)):
+        per_row = np.count_nonzero(tie, axis=1)
+        coin = np.concatenate([g.random(n) for g, n in zip(rng, per_row)])
+    else:
+        coin = rng.random(ties)
+    direction[tie] = np.where(coin > 0.5, 1, -1)
+    if counts is not None:
+        counts["turned_left"] = np.count_nonzero(left)
+        counts["turned_right"] = np.count_nonzero(right)
+        counts["turned_randomly"] = ties
+    return direction
+
+
+class ParticleStore:
+    """
+    Array-backed storage for a population of particles
+    Every attribute is a contiguous NumPy column indexed by particle id, so the
+    environment can operate on the whole population at once
+    """
+
+    COLUMNS = (
+        "rows",
+        "cols",
+        "orientation",
+        "sensor_distance",
+        "sensor_angle",
+        "angular_speed",
+    )
+
+    def __init__(
+        self,
+        sensor_distance=9.0,
+        sensor_angle=np.pi / 8,
+        angular_speed=np.pi / 4,
+        position_dtype=np.int64,
+        rng=None,
+    ):
+        """
+        rng = np.random.Generator or seed for orientations and random turns
+        """
+        self.rng = np.random.default_rng(rng)
+        self.default_sensor_distance = sensor_distance
+        self.default_sensor_angle = sensor_angle
+        self.default_angular_speed = angular_speed
+
+        self.rows = np.zeros(0, dtype=position_dtype)
+        self.cols = np.zeros(0, dtype=position_dtype)
+        self.orientation = np.zeros(0, dtype=np.float64)
+        self.sensor_distance = np.zeros(0, dtype=np.float64)
+        self.sensor_angle = np.zeros(0, dtype=np.float64)
+        self.angular_speed = np.zeros(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("particle index out of range")
+        return Particle.view(self, index % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Particle.view(self, i)
+
+    def add(self, rows, cols, orientation=None):
+        """
+        Appends particles at the given (row, col) positions and returns their indices
+        Orientations are drawn uniformly from [0, 2pi) unless given
+        """
+        rows = np.asarray(rows, dtype=self.rows.dtype).ravel()
+        cols = np.asarray(cols, dtype=self.cols.dtype).ravel()
+        count = len(rows)
+        if orientation is None:
+            orientation = 2 * np.pi * self.rng.random(count)
+
+        start = len(self)
+        self.rows = np.concatenate((self.rows, rows))
+        self.cols = np.concatenate((self.cols, cols))
+        self.orientation = np.concatenate(
+            (self.orientation, np.asarray(orientation, dtype=np.float64).ravel())
+        )
+        self.sensor_distance = np.concatenate(
+            (self.sensor_distance, np.full(count, self.default_sensor_distance))
+        )
+        self.sensor_angle = np.concatenate(
+            (self.sensor_angle, np.full(count, self.default_sensor_angle))
+        )
+        self.angular_speed = np.concatenate(
+            (self.angular_speed, np.full(count, self.default_angular_speed))
+        )
+        return np.arange(start, start + count)
+
+    def columns(self):
+        """
+        Returns the particle state as a dict of column name -> array
+        """
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def extend(self, columns):
+        """
+        Appends particles given as a dict of columns, e.g. from columns() or remove()
+        """
+        for name in self.COLUMNS:
+            current = getattr(self, name)
+            added = np.asarray(columns[name], dtype=current.dtype)
+            setattr(self, name, np.concatenate((current, added)))
+
+    def remove(self, mask):
+        """
+        Removes the particles selected by a boolean mask and returns them as columns
+        """
+        removed = {name: getattr(self, name)[mask] for name in self.COLUMNS}
+        for name in self.COLUMNS:
+            setattr(self, name, getattr(self, name)[~mask])
+        return removed
+
+    def get_sensor_values(self, arr):
+        """
+        Finds the chemoattractant value under the left, center and right sensor of
+        every particle in one gather over the periodic trail map
+        """
+        row, col = arr.shape
+        values = []
+        for side in (-1, 0, 1):
+            angle = self.orientation + side * self.sensor_angle
+            x = np.rint(self.sensor_distance * np.cos(angle)).astype(np.intp)
+            y = np.rint(self.sensor_distance * np.sin(angle)).astype(np.intp)
+            values.append(arr[(self.rows - x) % row, (self.cols + y) % col])
+        return values
+
+    def sense(self, arr, counts=None):
+        """
+        Batched equivalent of Particle.sense for every particle in the store
+        arr = trail map array
+        counts = optional dict filled with the turn counts, see turn_directions
+        """
+        L, C, R = self.get_sensor_values(arr)
+        directions = turn_directions(L, C, R, self.rng, counts)
+        self.orientation += directions * self.angular_speed
+
+
 class Particle:
-    def __init__(self, position):
-        self.position = position
-        self.orientation = 2 * np.pi * np.random.random()
-        self.sensor_distance = 9.0
-        self.sensor_angle = np.pi / 8
-        self.angular_speed = np.pi / 4
+    """
+    Thin view of a single particle inside a ParticleStore
+    Constructing a Particle directly creates a store holding only that particle
+    """
+
+    def __init__(self, position, rng=None):
+        self._store = ParticleStore(rng=rng)
+        self._index = 0
+        self._store.add([position[0]], [position[1]])
+
+    @classmethod
+    def view(cls, store, index):
+        particle = cls.__new__(cls)
+        particle._store = store
+        particle._index = index
+        return particle
+
+    @property
+    def position(self):
+        i = self._index
+        return (int(self._store.rows[i]), int(self._store.cols[i]))
+
+    @position.setter
+    def position(self, position):
+        i = self._index
+        self._store.rows[i], self._store.cols[i] = position
+
+    @property
+    def orientation(self):
+        return float(self._store.orientation[self._index])
+
+    @orientation.setter
+    def orientation(self, orientation):
+        self._store.orientation[self._index] = orientation
+
+    @property
+    def sensor_distance(self):
+        return float(self._store.sensor_distance[self._index])
+
+    @sensor_distance.setter
+    def sensor_distance(self, sensor_distance):
+        self._store.sensor_distance[self._index] = sensor_distance
+
+    @property
+    def sensor_angle(self):
+        return float(self._store.sensor_angle[self._index])
+
+    @sensor_angle.setter
+    def sensor_angle(self, sensor_angle):
+        self._store.sensor_angle[self._index] = sensor_angle
+
+    @property
+    def angular_speed(self):
+        return float(self._store.angular_speed[self._index])
+
+    @angular_speed.setter
+    def angular_speed(self, angular_speed):
+        self._store.angular_speed[self._index] = angular_speed
 
     def deposit_phermone_trail(self, arr, strength=1.0):
         """
@@ -57,7 +267,7 @@ class Particle:
             if L == R:
                 self.orientation += (
                     self.angular_speed
-                    if np.random.rand() > 0.5
+                    if self._store.rng.random() > 0.5
                     else -self.angular_speed
                 )
             # Otherwise, turn towards the higher value
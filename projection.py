@@ -0,0 +1,83 @@
+"""
+Projection of geographic coordinates onto map pixels
+The maps are plain lat/lon rectangles (equirectangular), so a projection is one
+affine transform per axis applied to whole coordinate arrays at once
+"""
+
+import functools
+import numpy as np
+
+# lat/lon bounds of the Massachusetts map (mass.jpg) used by every simulation
+MAP_BOUNDS = ((41.00, 43.00), (-73.50, -69.90))
+
+
+def lat_lon(points):
+    """
+    (latitudes, longitudes) float arrays of a sequence of geopy Points (or anything
+    with latitude and longitude attributes), or of an array of (lat, lon) rows
+    """
+    if isinstance(points, np.ndarray):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return points[:, 0], points[:, 1]
+    lat = np.fromiter((p.latitude for p in points), dtype=np.float64)
+    lon = np.fromiter((p.longitude for p in points), dtype=np.float64)
+    return lat, lon
+
+
+def project(lat, lon, size, bounds=MAP_BOUNDS, origin="south"):
+    """
+    Maps latitudes and longitudes to (x, y) float pixel coordinates on a map of
+    size = (extent along latitude, extent along longitude)
+    origin = "south" puts lat_min at 0 (like the slime textures), "north" puts
+    lat_max at 0 (like image rows and the Environment grid)
+    Coordinates outside the bounds are clamped to the map edge
+    """
+    (lat_min, lat_max), (lon_min, lon_max) = bounds
+    u = (np.asarray(lat, dtype=np.float64) - lat_min) / (lat_max - lat_min)
+    v = (np.asarray(lon, dtype=np.float64) - lon_min) / (lon_max - lon_min)
+    if origin == "north":
+        u = 1 - u
+    elif origin != "south":
+        raise ValueError("origin must be 'south' or 'north'")
+    return np.clip(u, 0, 1) * size[0], np.clip(v, 0, 1) * size[1]
+
+
+def project_uv(lat, lon, bounds=MAP_BOUNDS, origin="south"):
+    """
+    Same as project() onto the unit square, e.g. texture coordinates
+    """
+    return project(lat, lon, (1.0, 1.0), bounds, origin)
+
+
+class Projection:
+    """
+    Coordinates of a fixed set of points, projected once per (size, bounds, origin)
+    The cached arrays are read-only, copy them before modifying
+    """
+
+    def __init__(self, points):
+        self.lat, self.lon = lat_lon(points)
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.lat)
+
+    def pixels(self, size, bounds=MAP_BOUNDS, origin="south"):
+        key = (tuple(size), tuple(map(tuple, bounds)), origin)
+        if key not in self.cache:
+            x, y = project(self.lat, self.lon, size, bounds, origin)
+            x.flags.writeable = False
+            y.flags.writeable = False
+            self.cache[key] = (x, y)
+        return self.cache[key]
+
+    def uv(self, bounds=MAP_BOUNDS, origin="south"):
+        return self.pixels((1.0, 1.0), bounds, origin)
+
+
+@functools.lru_cache(maxsize=16)
+def city_projection(cities):
+    """
+    Projection of the coordinates of a tuple of city.City, cached per tuple
+    """
+    return Projection([city.coordinates for city in cities])
@@ -0,0 +1,256 @@
+"""
+Streaming frame output for simulation runs
+Trail maps are turned into uint8 RGB frames with a colormap lookup table and written
+one at a time, so memory use does not grow with the number of steps
+"""
+
+import functools
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import warnings
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def colormap_lut(name="viridis"):
+    """
+    (256, 3) uint8 lookup table of a matplotlib colormap
+    """
+    from matplotlib import colormaps
+
+    return (colormaps[name](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+
+
+def to_frame(arr, lut, vmin=None, vmax=None):
+    """
+    Maps a 2D array to an RGB frame, scaled to [vmin, vmax] like imshow
+    (default: the range of the array itself)
+    """
+    vmin = arr.min() if vmin is None else vmin
+    vmax = arr.max() if vmax is None else vmax
+    scale = 255 / (vmax - vmin) if vmax > vmin else 0
+    index = np.clip((arr - vmin) * scale, 0, 255).astype(np.uint8)
+    return lut[index]
+
+
+def write_png(path, frame):
+    """
+    Encodes an RGB uint8 frame as a PNG file without going through matplotlib
+    """
+    height, width, _ = frame.shape
+    # every scanline starts with filter type 0 (none)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = frame.reshape(height, width * 3)
+
+    def chunk(kind, data):
+        body = kind + data
+        crc = struct.pack(">I", zlib.crc32(body))
+        return struct.pack(">I", len(data)) + body + crc
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", header))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def encode_snapshot(path, arr, cmap="viridis", scale=1):
+    """
+    Colour-maps a 2D array and writes it to path as PNG, upscaled by an integer factor
+    """
+    frame = to_frame(arr, colormap_lut(cmap))
+    if scale > 1:
+        frame = frame.repeat(scale, axis=0).repeat(scale, axis=1)
+    write_png(path, frame)
+    return path
+
+
+class SnapshotWriter:
+    """
+    Encodes snapshots on a background pool while the simulation keeps running
+    Each submitted array is copied, so the caller may keep modifying it
+    max_pending = snapshots allowed in flight, submit() blocks once they are all taken
+    executor = "thread" (numpy and zlib release the GIL) or "process"
+    """
+
+    def __init__(
+        self, max_pending=4, workers=2, executor="thread", cmap="viridis", scale=1
+    ):
+        pool = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+        self.pool = pool(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.cmap = cmap
+        self.scale = scale
+        self.futures = []
+
+    def submit(self, arr, path):
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(
+                encode_snapshot, path, np.array(arr), self.cmap, self.scale
+            )
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+        # keep only unfinished futures and surface errors of finished ones early
+        done = [f for f in self.futures if f.done()]
+        self.futures = [f for f in self.futures if not f.done()]
+        for f in done:
+            f.result()
+        return future
+
+    def close(self):
+        """
+        Waits for every pending snapshot and re-raises the first encoding error
+        """
+        self.pool.shutdown(wait=True)
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PNGSequenceSink:
+    """
+    Writes every frame to its own PNG file, pattern is formatted with the frame number
+    start = number of the first frame, e.g. to continue a sequence after a resume
+    """
+
+    def __init__(self, pattern="frame_{:05d}.png", start=0):
+        self.pattern = pattern
+        self.frames = start
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame):
+        write_png(self.pattern.format(self.frames), frame)
+        self.frames += 1
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FFmpegSink:
+    """
+    Pipes raw RGB frames to an ffmpeg subprocess that encodes them as they arrive
+    The output format follows the extension of path (e.g. .gif or .mp4)
+    scale = integer upscaling with nearest neighbour sampling, for small grids
+    """
+
+    def __init__(self, path, fps=20, scale=1, ffmpeg="ffmpeg"):
+        self.path = path
+        self.fps = fps
+        self.scale = scale
+        self.ffmpeg = ffmpeg
+        self.process = None
+        self.shape = None
+        self.frames = 0
+
+    def start(self, shape):
+        height, width = shape
+        filters = ["scale=iw*{0}:ih*{0}:flags=neighbor".format(self.scale)]
+        if self.path.endswith(".mp4"):
+            # yuv420p (widely playable) needs even dimensions
+            filters.append("pad=ceil(iw/2)*2:ceil(ih/2)*2")
+        command = [
+            self.ffmpeg,
+            "-loglevel", "error",
+            "-y",
+            "-f", "rawvideo",
+            "-pix_fmt", "rgb24",
+            "-s", "{}x{}".format(width, height),
+            "-r", str(self.fps),
+            "-i", "-",
+            "-vf", ",".join(filters),
+        ]  # fmt: skip
+        if self.path.endswith(".mp4"):
+            command += ["-pix_fmt", "yuv420p"]
+        self.process = subprocess.Popen(command + [self.path], stdin=subprocess.PIPE)
+        self.shape = shape
+
+    def write(self, frame):
+        if self.process is None:
+            self.start(frame.shape[:2])
+        if frame.shape[:2] != self.shape:
+            raise ValueError("all frames must have the same size")
+        self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError("ffmpeg failed to encode {}".format(self.path))
+        self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def find_ffmpeg(ffmpeg="ffmpeg"):
+    """
+    Path of the ffmpeg executable: ffmpeg itself when it is on PATH, else the binary
+    bundled with the optional imageio-ffmpeg package, else None
+    """
+    path = shutil.which(ffmpeg)
+    if path is not None:
+        return path
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return None
+
+
+def open_sink(path, fps=20, scale=1, ffmpeg="ffmpeg", start=0):
+    """
+    Picks a frame sink for path: a PNG sequence for patterns such as
+    "frames/sim_{:05d}.png", otherwise an ffmpeg encoder
+    Without any ffmpeg (see find_ffmpeg) the frames are written as a PNG sequence
+    next to path instead, with a warning
+    start = number of the first frame, an encoded file cannot be appended to, so a
+    sequence continued from start > 0 is also written as PNGs next to path
+    """
+    if "{" in path:
+        return PNGSequenceSink(path, start)
+    pattern = os.path.splitext(path)[0] + "_{:05d}.png"
+    if start > 0:
+        warnings.warn(
+            "cannot append to {}, writing frames from {} on to {} instead".format(
+                path, start, pattern
+            )
+        )
+        return PNGSequenceSink(pattern, start)
+    executable = find_ffmpeg(ffmpeg)
+    if executable is None:
+        warnings.warn(
+            "ffmpeg not found (install it or imageio-ffmpeg) to encode {}, writing "
+            "frames to {} instead".format(path, pattern)
+        )
+        return PNGSequenceSink(pattern)
+    return FFmpegSink(path, fps, scale, executable)
@@ -1,10 +1,96 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 from environment import Environment
+from instrumentation import Instrumentation
+from recording import SnapshotWriter, colormap_lut, open_sink, to_frame
 
 
 class Scheduler:
+    @staticmethod
+    def advance(environment, const, sigma, checkpoint_every, checkpoint_path, params):
+        """
+        steps the environment once and writes a checkpoint every checkpoint_every steps
+        """
+        environment.step(const, sigma)
+        if checkpoint_every and environment.steps % checkpoint_every == 0:
+            environment.save_checkpoint(checkpoint_path, **params)
+
+    @staticmethod
+    def plot_pass(
+        environment,
+        steps,
+        checkpoint_path,
+        params,
+        snapshot_workers=2,
+        max_pending_snapshots=4,
+        convergence=None,
+        plot=True,
+    ):
+        """
+        steps the environment until steps in total, taking snapshots at the sample
+        steps of params["intervals"] (only if plot)
+        checkpoints record pass="plot", so resume() knows to continue here
+        """
+        N, M = environment.N, environment.M
+        params["pass"] = "plot"
+        intervals = params["intervals"]
+        dt = int(params["steps"] / intervals)
+        samples = np.linspace(0, dt * intervals, intervals + 1)  # integer samples
+        with SnapshotWriter(
+            max_pending_snapshots, snapshot_workers, scale=max(1, 800 // max(N, M))
+        ) as writer:
+            for i in range(environment.steps, steps):
+                Scheduler.advance(
+                    environment,
+                    params["const"],
+                    params["sigma"],
+                    params["checkpoint_every"],
+                    checkpoint_path,
+                    params,
+                )
+                if plot == True and i in samples:
+                    writer.submit(environment.trail_map, "sim_t{}.png".format(i))
+                if convergence is not None and convergence.update(environment):
+                    # keep a snapshot of the converged network
+                    if i not in samples:
+                        writer.submit(environment.trail_map, "sim_t{}.png".format(i))
+                    break
+
+    @staticmethod
+    def animate_pass(environment, start, checkpoint_path, params, convergence=None):
+        """
+        steps the environment params["steps"] times from step start, streaming one
+        frame per step to params["animation_path"]
+        checkpoints record pass="animate" and start, a resumed pass continues the
+        frame numbers from where the checkpoint was written
+        """
+        # frames are colour-mapped and streamed to the encoder one at a time,
+        # so memory stays constant however many steps are animated
+        # a "{}" pattern such as "frames/sim_{:05d}.png" writes a PNG sequence
+        params["pass"] = "animate"
+        params["animation_start"] = start
+        lut = colormap_lut()
+        scale = max(1, 800 // max(environment.N, environment.M))
+        with open_sink(
+            params["animation_path"],
+            fps=20,
+            scale=scale,
+            start=environment.steps - start,
+        ) as sink:
+            for i in range(environment.steps, start + params["steps"]):
+                if convergence is not None and convergence.converged:
+                    break
+                Scheduler.advance(
+                    environment,
+                    params["const"],
+                    params["sigma"],
+                    params["checkpoint_every"],
+                    checkpoint_path,
+                    params,
+                )
+                sink.write(to_frame(environment.trail_map, lut))
+                if convergence is not None:
+                    convergence.update(environment)
+
     @staticmethod
     def run(
         N=200,
@@ -16,6 +102,14 @@ class Scheduler:
         intervals=8,
         plot=True,
         animate=True,
+        checkpoint_every=None,
+        checkpoint_path="checkpoint.npz",
+        animation_path="sim.gif",
+        snapshot_workers=2,
+        max_pending_snapshots=4,
+        trace_path=None,
+        seed=None,
+        convergence=None,
     ):
         """
         generates the environment (NxM) with pp% of environment populated
@@ -23,44 +117,98 @@ class Scheduler:
         chemoattractant: constant multiplier, sigma (gaussian filter)
         evolve simulation for 500 steps, grab plots at specific intervals
         choice to plot intervals OR animate the desired simulation
+        checkpoint_every = save the full state to checkpoint_path every k steps,
+        continue an interrupted run with Scheduler.resume(checkpoint_path)
+        snapshots are encoded in the background by snapshot_workers threads, the loop
+        only waits when max_pending_snapshots are still being written
+        trace_path = record per-stage timings and counters of every step, written as a
+        Chrome trace (.json) or JSON lines (any other extension) when the run ends
+        seed = seed for the environment's random generator, same seed = same run
+        convergence = a convergence.ConvergenceMonitor, the run stops early once it
+        reports the trail network stable (see its reason and step)
+        returns the environment
         """
-        environment = Environment(N, M, pp)
+        environment = Environment(N, M, pp, seed=seed)
         environment.populate()
+        if trace_path is not None:
+            environment.instrumentation = Instrumentation()
+        params = dict(
+            const=const,
+            sigma=sigma,
+            steps=steps,
+            intervals=intervals,
+            checkpoint_every=checkpoint_every,
+            animate=animate,
+            animation_path=animation_path,
+        )
 
         if plot == True:
-            dt = int(steps / intervals)
-            samples = np.linspace(0, dt * intervals, intervals + 1)  # integer samples
-            for i in range(steps):
-                environment.diffusion_operator(const, sigma)
-                environment.motor_stage()
-                environment.sensory_stage()
-                if i in samples:
-                    fig = plt.figure(figsize=(8, 8), dpi=200)
-                    ax1 = fig.add_subplot(111)
-                    ax1.imshow(environment.trail_map)
-                    ax1.set_title("Chemoattractant Map, step={}".format(i))
-                    plt.savefig("sim_t{}.png".format(i))
-                    plt.clf()
-
+            Scheduler.plot_pass(
+                environment,
+                steps,
+                checkpoint_path,
+                params,
+                snapshot_workers,
+                max_pending_snapshots,
+                convergence,
+            )
         if animate == True:
-            # this can take a while for large environments, high population
-            # also generates very large .gif files, play with values to get smaller files
-            ims = []
-            fig = plt.figure(figsize=(8, 8), dpi=100)
-            ax = fig.add_subplot(111)
-            for i in range(steps):
-                environment.diffusion_operator(const, sigma)
-                environment.motor_stage()
-                environment.sensory_stage()
-                txt = plt.text(
-                    0,
-                    -10,
-                    "iteration: {}".format(i),
+            Scheduler.animate_pass(
+                environment, environment.steps, checkpoint_path, params, convergence
+            )
+
+        if trace_path is not None:
+            environment.instrumentation.export(trace_path)
+        return environment
+
+    @staticmethod
+    def resume(
+        checkpoint_path="checkpoint.npz", steps=None, plot=True, checkpoint_every=None
+    ):
+        """
+        continues a run saved by Scheduler.run(checkpoint_every=k) from the pass that
+        wrote the checkpoint, with the original const and sigma
+        a plotting pass runs until steps in total (default: the steps of the original
+        run), with plots at the sample steps of the original intervals, then the
+        animation pass follows if the original run animated
+        an animation pass runs steps more steps after the plotting pass and continues
+        the frame numbers; an encoded animation (.gif, .mp4, ...) cannot be appended
+        to, so the remaining frames are written as PNGs next to it
+        checkpoint_every = defaults to the interval of the original run, so the resumed
+        run keeps checkpointing to checkpoint_path
+        raises a ValueError if the checkpoint is already past the end of its pass
+        returns the environment
+        """
+        environment = Environment.load_checkpoint(checkpoint_path)
+        params = dict(environment.checkpoint_params)
+        if checkpoint_every is None:
+            checkpoint_every = params.get("checkpoint_every")
+        params.setdefault("pass", "plot")
+        params.setdefault("animate", False)
+        params["steps"] = params["steps"] if steps is None else steps
+        params["checkpoint_every"] = checkpoint_every
+
+        if params["pass"] == "plot":
+            end = params["steps"]
+        else:
+            end = params["animation_start"] + params["steps"]
+        if environment.steps > end or (
+            environment.steps == end
+            and not (params["pass"] == "plot" and params["animate"])
+        ):
+            raise ValueError(
+                "checkpoint is at step {}, past the end of its {} pass at step "
+                "{}".format(environment.steps, params["pass"], end)
+            )
+
+        if params["pass"] == "plot":
+            Scheduler.plot_pass(environment, end, checkpoint_path, params, plot=plot)
+            if params["animate"] == True:
+                Scheduler.animate_pass(
+                    environment, environment.steps, checkpoint_path, params
                 )
-                im = plt.imshow(environment.trail_map, animated=True)
-                ims.append([im, txt])
-            fig.suptitle("Chemoattractant Map")
-            ani = animation.ArtistAnimation(
-                fig, ims, interval=50, blit=True, repeat_delay=1000
+        else:
+            Scheduler.animate_pass(
+                environment, params["animation_start"], checkpoint_path, params
             )
-            ani.save("sim.gif")
+        return environment
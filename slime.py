@@ -8,65 +8,7 @@ import numpy as np
 import imgui
 from moderngl_window.integrations.imgui import ModernglWindowRenderer
 from city import cities
-
-
-def coord_to_pixel(coord, size):
-    lat_min, lat_max = 41.00, 43.00
-    lon_min, lon_max = -73.50, -69.90
-
-    x = np.interp(coord.latitude, [lat_min, lat_max], [0, size[0]])
-    y = np.interp(coord.longitude, [lon_min, lon_max], [0, size[1]])
-
-    return x, y
-
-
-def generate_food_data(size):
-    food_data = np.zeros((len(cities), 4), dtype="f4")
-
-    for i, city in enumerate(cities):
-        x, y = coord_to_pixel(city.coordinates, size)
-        # Map the latitude and longitude to the image coordinates
-        food_data[i, 0] = x
-        food_data[i, 1] = y
-        # food_data[i, 2] = np.sqrt(city.population / np.pi) / 10.0
-        food_data[i, 2] = 10
-        food_data[i, 3] = 0
-
-    return np.c_[food_data[:, 0], food_data[:, 1], food_data[:, 2], food_data[:, 3]]
-
-
-def generate_slime_data(N, food_data, size):
-    # Randomly select a food to start at for each slime particle
-    city_indices = np.random.choice(len(food_data), N)
-    x = food_data[city_indices, 0]
-    y = food_data[city_indices, 1]
-
-    # Generate random angles for the slime particles
-    angles = np.random.uniform(0, 2 * np.pi, N)
-
-    return np.c_[x, y, angles, np.empty(N)]
-
-    # # Generate random x and y coordinates within the bounds of the size
-    # x = np.random.uniform(0, size[0], N)
-    # y = np.random.uniform(0, size[1], N)
-
-    # # Generate random angles for the slime particles
-    # angles = np.random.uniform(0, 2 * np.pi, N)
-
-    # return np.c_[x, y, angles, np.empty(N)]
-
-
-class SlimeConfig:
-    num_slimes = 1000000
-
-    move_speed = 50.0
-    angular_speed = 50.0
-
-    sensor_distance = 10.0
-    sensor_angle = 0.83
-
-    evaporation_speed = 5.0
-    diffusion_speed = 10.0
+from slime_data import SlimeConfig, generate_food_data, generate_slime_data
 
 
 class SlimeWindow(mglw.WindowConfig):
@@ -90,6 +32,9 @@ class SlimeWindow(mglw.WindowConfig):
         self.next_texture = None
         self.food = None
         self.slimes = None
+        self.food_data = None
+        self.slime_data = None  # host copy of the initial agents, reused on restart
+        self.loaded_slimes = 0  # agents currently in the slimes buffer
 
         self.create_textures()
         self.generate_data()
@@ -121,20 +66,42 @@ class SlimeWindow(mglw.WindowConfig):
 
     def generate_data(self):
         food_data = generate_food_data(self.map_size).astype("f4")
+        self.food_data = food_data
         if self.food is None:
             self.food = self.ctx.buffer(food_data)
         else:
             self.food.orphan(len(cities) * 4 * 4)
             self.food.write(food_data)
 
-        slime_data = generate_slime_data(
-            SlimeConfig.num_slimes, food_data, self.map_size
-        ).astype("f4")
-        if self.slimes is None:
-            self.slimes = self.ctx.buffer(slime_data)
+        # float32 rows written straight into the previous host buffer when it fits
+        self.slime_data = generate_slime_data(
+            SlimeConfig.num_slimes, food_data, self.map_size, out=self.slime_data
+        )
+        if self.slimes is None or self.slimes.size < self.slime_data.nbytes:
+            if self.slimes is not None:
+                self.slimes.release()
+            self.slimes = self.ctx.buffer(self.slime_data)
         else:
-            self.slimes.orphan(SlimeConfig.num_slimes * 4 * 4)
-            self.slimes.write(slime_data)
+            self.slimes.write(self.slime_data)
+        self.loaded_slimes = SlimeConfig.num_slimes
+
+    def resize_slimes(self):
+        """
+        Applies a new num_slimes without restarting: the running agents are kept and
+        only the added agents are generated, removed agents are simply not dispatched
+        """
+        old, new = self.loaded_slimes, SlimeConfig.num_slimes
+        if new > old:
+            added = generate_slime_data(new - old, self.food_data, self.map_size)
+            if self.slimes.size < new * 4 * 4:
+                # grow on the GPU, the running agents never travel back to the host
+                grown = self.ctx.buffer(reserve=new * 4 * 4)
+                self.ctx.copy_buffer(grown, self.slimes, old * 4 * 4)
+                self.slimes.release()
+                self.slimes = grown
+            self.slimes.write(added, offset=old * 4 * 4)
+        self.loaded_slimes = new
+        self.slime_shader["numSlimes"] = new
 
     def update_uniforms(self):
         self.blur_shader["diffuseSpeed"] = SlimeConfig.diffusion_speed
@@ -257,6 +224,8 @@ class SlimeWindow(mglw.WindowConfig):
                 "Number of Slimes", SlimeConfig.num_slimes, step=1024, step_fast=2**15
             )
             SlimeConfig.num_slimes = min(max(2048, SlimeConfig.num_slimes), 2**24)
+            if changed:
+                self.resize_slimes()
 
             if imgui.button("Restart Simulation"):
                 self.restart_sim()
@@ -297,4 +266,5 @@ class SlimeWindow(mglw.WindowConfig):
         self.imgui.unicode_char_entered(char)
 
 
-SlimeWindow.run()
+if __name__ == "__main__":
+    SlimeWindow.run()
@@ -0,0 +1,184 @@
+"""
+Headless NumPy implementation of the continuous-position slime model of slime.py
+Runs the same food, slime and blur passes as the compute shaders on the CPU, on the
+arrays of slime_data.generate_food_data and generate_slime_data, e.g.
+
+    size = (2560, 1440)
+    food = generate_food_data(size)
+    model = SlimeModel(size, food, generate_slime_data(10**6, food, size), seed=0)
+    model.run(600)
+
+Agents are updated in chunks, so the temporaries of a step are bounded by the chunk
+size however many agents there are
+"""
+
+import numpy as np
+from scipy import ndimage
+from slime_data import SlimeConfig
+
+
+class SlimeModel:
+    """
+    size = (width, height) of the map, the trail map is indexed [x, y] like the
+    texture the shaders write
+    food = (F, 4) rows of (x, y, radius, 0)
+    slimes = (A, 4) rows of (x, y, angle, unused), updated in place when it is a
+    float32 array like the buffer uploaded to the GPU
+    config = object with the SlimeConfig attributes
+    dt = seconds per step, the shaders scale speeds and rates by the frame time
+    chunk_size = agents updated per vectorized pass
+    """
+
+    def __init__(
+        self,
+        size,
+        food,
+        slimes,
+        config=SlimeConfig,
+        dt=1 / 60,
+        chunk_size=2**16,
+        seed=None,
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.size = tuple(size)
+        self.config = config
+        self.dt = dt
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(seed)
+        self.slimes = np.asarray(slimes, dtype=np.float32)
+        self.trail_map = np.zeros(self.size, dtype=np.float32)
+        self.next_map = np.zeros_like(self.trail_map)
+        self.blurred = np.zeros_like(self.trail_map)  # scratch map of the blur pass
+        self.food_index = self.food_cells(np.asarray(food, dtype=np.float64))
+        self.steps = 0
+
+    def food_cells(self, food):
+        """
+        flat indices of every map cell within the radius of a food source, computed
+        once so the food pass is a single scatter
+        """
+        width, height = self.size
+        cells = []
+        for x, y, radius, _ in food:
+            r = int(np.ceil(radius))
+            dx, dy = np.mgrid[-r : r + 1, -r : r + 1]
+            inside = dx**2 + dy**2 <= radius**2
+            cx = int(x) + dx[inside]
+            cy = int(y) + dy[inside]
+            keep = (cx >= 0) & (cx < width) & (cy >= 0) & (cy < height)
+            cells.append(cx[keep] * height + cy[keep])
+        if not cells:
+            return np.zeros(0, dtype=np.intp)
+        return np.unique(np.concatenate(cells))
+
+    def sense(self, x, y, angle):
+        """
+        trail value under a sensor, sensors off the map read the nearest edge texel
+        """
+        width, height = self.size
+        distance = self.config.sensor_distance
+        sx = (x + np.cos(angle) * distance).astype(np.intp)
+        sy = (y + np.sin(angle) * distance).astype(np.intp)
+        np.clip(sx, 0, width - 1, out=sx)
+        np.clip(sy, 0, height - 1, out=sy)
+        return self.trail_map[sx, sy]
+
+    def update_agents(self, chunk):
+        """
+        slime pass over one chunk of agents: sense the current map, steer, move and
+        deposit onto the next map
+        """
+        config, dt = self.config, self.dt
+        width, height = self.size
+        x, y, angle = (chunk[:, i].astype(np.float64) for i in range(3))
+        # two draws per agent whatever happens to it, so every agent consumes the
+        # same numbers of the stream however the agents are chunked
+        steer, heading = self.rng.random((len(chunk), 2)).T
+
+        forward = self.sense(x, y, angle)
+        left = self.sense(x, y, angle + config.sensor_angle)
+        right = self.sense(x, y, angle - config.sensor_angle)
+
+        turn = config.angular_speed * dt
+        ahead = (forward > left) & (forward > right)
+        lost = ~ahead & (forward < left) & (forward < right)
+        to_left = ~ahead & ~lost & (left > right)
+        to_right = ~ahead & ~lost & (right > left)
+        angle[lost] += (steer[lost] - 0.5) * 2 * turn
+        angle[to_left] += steer[to_left] * turn
+        angle[to_right] -= steer[to_right] * turn
+
+        x += np.cos(angle) * config.move_speed * dt
+        y += np.sin(angle) * config.move_speed * dt
+        # agents leaving the map stop at the edge and pick a new random heading
+        outside = (x < 0) | (x >= width) | (y < 0) | (y >= height)
+        np.clip(x, 0, np.nextafter(width, 0), out=x)
+        np.clip(y, 0, np.nextafter(height, 0), out=y)
+        angle[outside] = 2 * np.pi * heading[outside]
+
+        self.next_map[x.astype(np.intp), y.astype(np.intp)] = 1.0
+        chunk[:, 0] = x
+        chunk[:, 1] = y
+        chunk[:, 2] = angle
+
+    def blur(self):
+        """
+        blur pass: 3x3 mean blended in by the diffusion rate, then evaporation
+        """
+        config, dt = self.config, self.dt
+        blurred = self.blurred
+        ndimage.uniform_filter(self.next_map, size=3, output=blurred, mode="nearest")
+        blurred -= self.next_map
+        blurred *= np.clip(config.diffusion_speed * dt, 0, 1)
+        self.next_map += blurred
+        self.next_map -= config.evaporation_speed * dt
+        np.maximum(self.next_map, 0, out=self.next_map)
+
+    def step(self):
+        """
+        food, slime and blur passes, reading the current map and writing the next one
+        """
+        np.copyto(self.next_map, self.trail_map)
+        self.next_map.ravel()[self.food_index] = 1.0
+        for start in range(0, len(self.slimes), self.chunk_size):
+            self.update_agents(self.slimes[start : start + self.chunk_size])
+        self.blur()
+        self.trail_map, self.next_map = self.next_map, self.trail_map
+        self.steps += 1
+
+    def run(self, steps):
+        for _ in range(steps):
+            self.step()
+        return self.trail_map
+
+
+def check_chunking(size=(64, 64), agents=5000, chunk_sizes=(5000, 1000), steps=20):
+    """
+    Runs the same seeded model with different chunk sizes and returns whether the
+    trail maps and agents all came out identical
+    """
+    rng = np.random.default_rng(0)
+    slimes = np.zeros((agents, 4), dtype=np.float32)
+    slimes[:, 0] = rng.uniform(0, size[0], agents)
+    slimes[:, 1] = rng.uniform(0, size[1], agents)
+    slimes[:, 2] = rng.uniform(0, 2 * np.pi, agents)
+    food = np.array([[size[0] / 2, size[1] / 2, 4, 0]])
+
+    runs = []
+    for chunk_size in chunk_sizes:
+        model = SlimeModel(size, food, slimes.copy(), chunk_size=chunk_size, seed=1)
+        model.run(steps)
+        runs.append(model)
+    first = runs[0]
+    return all(
+        np.array_equal(first.trail_map, model.trail_map)
+        and np.array_equal(first.slimes, model.slimes)
+        for model in runs[1:]
+    )
+
+
+if __name__ == "__main__":
+    if not check_chunking():
+        raise SystemExit("results depend on the chunk size")
+    print("results are identical for every chunk size")
@@ -0,0 +1,77 @@
+"""
+Input data and parameters of the continuous-position slime model
+Kept apart from slime.py so the model can be set up without OpenGL, e.g. by the
+CPU implementation in slime_cpu.py
+Food rows are (x, y, radius, 0) and slime rows are (x, y, angle, unused), in the
+pixel coordinates of the simulated map
+"""
+
+import numpy as np
+from projection import MAP_BOUNDS, city_projection, project
+
+
+def coord_to_pixel(coord, size):
+    x, y = project(coord.latitude, coord.longitude, size, MAP_BOUNDS)
+    return float(x), float(y)
+
+
+def generate_food_data(size, cities=None):
+    if cities is None:
+        from city import cities
+    food_data = np.zeros((len(cities), 4), dtype="f4")
+
+    # Map the latitude and longitude to the image coordinates, all cities at once
+    if hasattr(cities, "projection"):  # a city.CityCatalog, already columnar
+        x, y = cities.projection.pixels(size, MAP_BOUNDS)
+    else:
+        x, y = city_projection(tuple(cities)).pixels(size, MAP_BOUNDS)
+    food_data[:, 0] = x
+    food_data[:, 1] = y
+    # food_data[:, 2] = np.sqrt(population / np.pi) / 10.0
+    food_data[:, 2] = 10
+    return food_data
+
+
+def generate_slime_data(N, food_data, size, rng=None, out=None, chunk_size=2**20):
+    """
+    (N, 4) float32 agent rows of (x, y, angle, 0), each agent starting on a random food
+    out = (N, 4) float32 buffer to fill instead of allocating one, e.g. the buffer of
+    the previous run or the tail of a larger one
+    Rows are generated chunk_size at a time, so the only temporaries are per chunk
+    """
+    rng = np.random.default_rng(rng)
+    if out is None or out.shape != (N, 4) or out.dtype != np.float32:
+        out = np.empty((N, 4), dtype=np.float32)
+    food_xy = np.asarray(food_data, dtype=np.float32)[:, :2]
+
+    for start in range(0, N, chunk_size):
+        stop = min(start + chunk_size, N)
+        # Randomly select a food to start at for each slime particle
+        city_indices = rng.integers(len(food_xy), size=stop - start)
+        out[start:stop, :2] = food_xy[city_indices]
+        # Generate random angles for the slime particles
+        out[start:stop, 2] = rng.uniform(0, 2 * np.pi, stop - start)
+        out[start:stop, 3] = 0
+    return out
+
+    # # Generate random x and y coordinates within the bounds of the size
+    # x = np.random.uniform(0, size[0], N)
+    # y = np.random.uniform(0, size[1], N)
+
+    # # Generate random angles for the slime particles
+    # angles = np.random.uniform(0, 2 * np.pi, N)
+
+    # return np.c_[x, y, angles, np.empty(N)]
+
+
+class SlimeConfig:
+    num_slimes = 1000000
+
+    move_speed = 50.0
+    angular_speed = 50.0
+
+    sensor_distance = 10.0
+    sensor_angle = 0.83
+
+    evaporation_speed = 5.0
+    diffusion_speed = 10.0